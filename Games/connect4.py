@@ -1,9 +1,11 @@
 import pygame
 import sys
 import random
-
-# Initialize Pygame
-pygame.init()
+import time
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from rendering import get_font
 
 # ---------------------------
 # Game Constants
@@ -22,9 +24,6 @@ BLUE = (0, 0, 255)
 RED = (255, 0, 0)
 YELLOW = (255, 255, 0)
 
-# Font
-FONT = pygame.font.SysFont('Arial', 30)
-
 # ---------------------------
 # Game Board Class
 # ---------------------------
@@ -73,6 +72,114 @@ class Board:
     def is_full(self):
         return all(self.grid[0][col] != 0 for col in range(COLS))
 
+# ---------------------------
+# Bitboard
+# ---------------------------
+# Each column takes ROWS + 1 bits, from the bottom row up, the extra bit keeps lines from wrapping between columns
+COLUMN_BITS = ROWS + 1
+# Shifts between neighbouring cells: vertical, horizontal and the two diagonals
+DIRECTION_SHIFTS = (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1)
+# Playable cells, without the extra bit of each column
+BOARD_MASK = sum(((1 << ROWS) - 1) << (col * COLUMN_BITS) for col in range(COLS))
+# Zobrist keys of each player on each cell, and of player 2 to move, from a dedicated generator
+_zobrist_rng = random.Random(0)
+ZOBRIST_KEYS = [[_zobrist_rng.getrandbits(64) for _ in range(COLS * COLUMN_BITS)] for _ in range(2)]
+ZOBRIST_SIDE_KEY = _zobrist_rng.getrandbits(64)
+
+class BitBoard:
+    """
+    Connect Four position stored as one bitmask per player plus the height of each column, for fast search.
+    Bit col * COLUMN_BITS + r is the cell of column col at r rows from the bottom.
+    """
+    def __init__(self):
+        self.masks = [0, 0]  # pieces of player 1 and player 2
+        self.heights = [col * COLUMN_BITS for col in range(COLS)]  # next free bit of each column
+        self.moves = []
+        self.hash = 0  # Zobrist hash of the pieces, updated incrementally
+
+    @classmethod
+    def from_board(cls, board):
+        bitboard = cls()
+        for col in range(COLS):
+            for row in range(ROWS - 1, -1, -1):
+                piece = board.grid[row][col]
+                if piece == 0:
+                    break
+                bitboard.masks[piece - 1] |= 1 << bitboard.heights[col]
+                bitboard.hash ^= ZOBRIST_KEYS[piece - 1][bitboard.heights[col]]
+                bitboard.heights[col] += 1
+        return bitboard
+
+    def to_board(self):
+        board = Board()
+        for col in range(COLS):
+            for r in range(ROWS):
+                bit = 1 << (col * COLUMN_BITS + r)
+                if self.masks[0] & bit:
+                    board.grid[ROWS - 1 - r][col] = 1
+                elif self.masks[1] & bit:
+                    board.grid[ROWS - 1 - r][col] = 2
+        return board
+
+    def is_valid_location(self, col):
+        return self.heights[col] < col * COLUMN_BITS + ROWS
+
+    def valid_columns(self):
+        return [col for col in range(COLS) if self.is_valid_location(col)]
+
+    def make_move(self, col, piece):
+        self.masks[piece - 1] |= 1 << self.heights[col]
+        self.hash ^= ZOBRIST_KEYS[piece - 1][self.heights[col]]
+        self.heights[col] += 1
+        self.moves.append(col)
+
+    def unmake_move(self):
+        # undo the last move made with make_move
+        col = self.moves.pop()
+        self.heights[col] -= 1
+        bit = 1 << self.heights[col]
+        piece = 1 if self.masks[0] & bit else 2
+        self.masks[piece - 1] &= ~bit
+        self.hash ^= ZOBRIST_KEYS[piece - 1][self.heights[col]]
+
+    def key(self, piece):
+        # hash of the position with piece to move
+        return self.hash ^ ZOBRIST_SIDE_KEY if piece == 2 else self.hash
+
+    @staticmethod
+    def has_four(mask):
+        # a pair of shifts per direction finds four aligned pieces
+        for shift in DIRECTION_SHIFTS:
+            pairs = mask & (mask >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def check_for_win(self, piece):
+        return self.has_four(self.masks[piece - 1])
+
+    def is_winning_move(self, col, piece):
+        # win check of a move without playing it
+        return self.has_four(self.masks[piece - 1] | (1 << self.heights[col]))
+
+    def is_full(self):
+        return all(not self.is_valid_location(col) for col in range(COLS))
+
+    def threats(self, piece):
+        # empty cells that would complete four in a row for the player
+        mask = self.masks[piece - 1]
+        # vertical: three pieces below
+        cells = (mask << 1) & (mask << 2) & (mask << 3)
+        # horizontal and diagonals: three pieces around the cell, on either side
+        for shift in DIRECTION_SHIFTS[1:]:
+            pairs = (mask << shift) & (mask << 2 * shift)
+            cells |= pairs & (mask << 3 * shift)
+            cells |= pairs & (mask >> shift)
+            pairs = (mask >> shift) & (mask >> 2 * shift)
+            cells |= pairs & (mask << shift)
+            cells |= pairs & (mask >> 3 * shift)
+        return cells & BOARD_MASK & ~(self.masks[0] | self.masks[1])
+
 # ---------------------------
 # Agent Interface
 # ---------------------------
@@ -88,11 +195,14 @@ class AgentInterface:
 # Simple Computer Player
 # ---------------------------
 class SimpleComputerPlayer(AgentInterface):
+    def __init__(self, rng=random):
+        self.rng = rng  # random module or a seeded random.Random for the choice of the columns
+
     def act(self, board, piece):
         # Basic AI: Choose the first available column
         valid_columns = [c for c in range(COLS) if board.is_valid_location(c)]
         if valid_columns:
-            return random.choice(valid_columns)
+            return self.rng.choice(valid_columns)
         else:
             return None
 
@@ -102,22 +212,13 @@ class SimpleComputerPlayer(AgentInterface):
 class HeuristicAgent(AgentInterface):
     def act(self, board, piece):
         # Attempt to win or block opponent from winning
+        bitboard = BitBoard.from_board(board)
+        opponent = 1 if piece == 2 else 2
         for col in range(COLS):
-            if board.is_valid_location(col):
-                row = board.get_next_open_row(col)
-                # Try to win
-                board.drop_piece(row, col, piece)
-                if board.check_for_win(piece):
-                    board.drop_piece(row, col, 0)
+            if bitboard.is_valid_location(col):
+                # Try to win, then try to block opponent
+                if bitboard.is_winning_move(col, piece) or bitboard.is_winning_move(col, opponent):
                     return col
-                board.drop_piece(row, col, 0)
-                # Try to block opponent
-                opponent = 1 if piece == 2 else 2
-                board.drop_piece(row, col, opponent)
-                if board.check_for_win(opponent):
-                    board.drop_piece(row, col, 0)
-                    return col
-                board.drop_piece(row, col, 0)
         # Otherwise, choose random
         valid_columns = [c for c in range(COLS) if board.is_valid_location(c)]
         if valid_columns:
@@ -125,11 +226,348 @@ class HeuristicAgent(AgentInterface):
         else:
             return None
 
+# ---------------------------
+# Alpha-Beta Search Agent
+# ---------------------------
+WIN_SCORE = 1000000
+CENTER_ORDER = sorted(range(COLS), key=lambda col: abs(col - COLS // 2))
+CENTER_MASK = ((1 << ROWS) - 1) << (COLS // 2 * COLUMN_BITS)
+# Bounds stored in the transposition table
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class SearchTimeout(Exception):
+    pass
+
+class AlphaBetaAgent(AgentInterface):
+    """
+    Negamax search with alpha-beta pruning on a BitBoard, deepened iteratively until the time budget of the move
+    runs out. Moves are ordered center first, after the best move stored in the transposition table.
+    The transposition table has tt_size slots indexed by Zobrist hash; an entry is replaced by a search at
+    least as deep, or by any search once it comes from a previous move.
+    """
+    def __init__(self, time_budget=1.0, max_depth=ROWS * COLS, tt_size=2 ** 20):
+        self.time_budget = time_budget  # seconds per move
+        self.max_depth = max_depth
+        self.tt_size = tt_size
+        self.tt = [None] * tt_size  # (key, depth, value, flag, move, generation)
+        self.generation = 0
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def act(self, board, piece):
+        bitboard = BitBoard.from_board(board)
+        valid_columns = bitboard.valid_columns()
+        if not valid_columns:
+            return None
+        self.generation += 1
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        best_move = next(col for col in CENTER_ORDER if col in valid_columns)
+        empty_cells = ROWS * COLS - bin(bitboard.masks[0] | bitboard.masks[1]).count('1')
+        for depth in range(1, min(self.max_depth, empty_cells) + 1):
+            try:
+                value, move = self._search_root(bitboard, piece, depth, best_move)
+            except SearchTimeout:
+                break
+            best_move = move
+            self.depth_reached = depth
+            # stop once the game is decided
+            if abs(value) >= WIN_SCORE - ROWS * COLS:
+                break
+        return best_move
+
+    def _search_root(self, bitboard, piece, depth, previous_best):
+        opponent = 3 - piece
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_value, best_move = -WIN_SCORE - 1, previous_best
+        moves = [previous_best] + [col for col in CENTER_ORDER if col != previous_best and bitboard.is_valid_location(col)]
+        for col in moves:
+            if bitboard.is_winning_move(col, piece):
+                return WIN_SCORE - 1, col
+            bitboard.make_move(col, piece)
+            value = -self._negamax(bitboard, opponent, depth - 1, -beta, -alpha, 1)
+            bitboard.unmake_move()
+            if value > best_value:
+                best_value, best_move = value, col
+            alpha = max(alpha, value)
+        return best_value, best_move
+
+    def _negamax(self, bitboard, piece, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        valid_columns = bitboard.valid_columns()
+        if not valid_columns:
+            return 0
+        for col in valid_columns:
+            if bitboard.is_winning_move(col, piece):
+                return WIN_SCORE - ply
+        if depth == 0:
+            return self._evaluate(bitboard, piece)
+
+        # transposition table lookup, win scores are stored relative to this node
+        key = bitboard.key(piece)
+        index = key % self.tt_size
+        entry = self.tt[index]
+        tt_move = None
+        if entry is not None and entry[0] == key:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                value = self._score_from_tt(entry[2], ply)
+                if entry[3] == EXACT:
+                    return value
+                if entry[3] == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                elif entry[3] == UPPER_BOUND:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+
+        alpha_original = alpha
+        opponent = 3 - piece
+        best_value, best_move = -WIN_SCORE - 1, None
+        moves = [col for col in CENTER_ORDER if col != tt_move and bitboard.is_valid_location(col)]
+        if tt_move is not None and bitboard.is_valid_location(tt_move):
+            moves.insert(0, tt_move)
+        for col in moves:
+            bitboard.make_move(col, piece)
+            value = -self._negamax(bitboard, opponent, depth - 1, -beta, -alpha, ply + 1)
+            bitboard.unmake_move()
+            if value > best_value:
+                best_value, best_move = value, col
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best_value <= alpha_original:
+            flag = UPPER_BOUND
+        elif best_value >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        if entry is None or entry[5] != self.generation or depth >= entry[1]:
+            self.tt[index] = (key, depth, self._score_to_tt(best_value, ply), flag, best_move, self.generation)
+        return best_value
+
+    def _evaluate(self, bitboard, piece):
+        # threats (cells completing four) count most, then pieces in the center column
+        opponent = 3 - piece
+        threats = bin(bitboard.threats(piece)).count('1') - bin(bitboard.threats(opponent)).count('1')
+        center = bin(bitboard.masks[piece - 1] & CENTER_MASK).count('1') - bin(bitboard.masks[opponent - 1] & CENTER_MASK).count('1')
+        return 10 * threats + center
+
+    @staticmethod
+    def _score_to_tt(value, ply):
+        if value >= WIN_SCORE - ROWS * COLS:
+            return value + ply
+        if value <= -WIN_SCORE + ROWS * COLS:
+            return value - ply
+        return value
+
+    @staticmethod
+    def _score_from_tt(value, ply):
+        if value >= WIN_SCORE - ROWS * COLS:
+            return value - ply
+        if value <= -WIN_SCORE + ROWS * COLS:
+            return value + ply
+        return value
+
+# ---------------------------
+# Training Environments
+# ---------------------------
+# The agent plays piece 1 and the opponent piece 2, rewards are 1 for a win, -1 for a loss or an invalid move, 0 otherwise
+AGENT_PIECE, OPPONENT_PIECE = 1, 2
+
+def get_opponent_policy(opponent, rng=random):
+    # agents are used through their act method, functions are called directly with (board, piece)
+    if opponent is None:
+        opponent = SimpleComputerPlayer(rng)
+    return opponent.act if hasattr(opponent, 'act') else opponent
+
+class ConnectFourEnv(gym.Env):
+    """
+    Headless Connect Four against a fixed opponent, the opponent answers within the same step.
+    The observation is the grid (0: empty, 1: agent, 2: opponent) and info['action_mask'] flags the columns
+    that are not full, also available from action_masks().
+    """
+    metadata = {'render_modes': ['ansi']}
+
+    def __init__(self, opponent=None, agent_starts=True):
+        super().__init__()
+        self.opponent = opponent
+        # random module until reset is given a seed, then a generator of this environment only
+        self.rng = random
+        self.opponent_policy = get_opponent_policy(opponent, self.rng)
+        self.agent_starts = agent_starts  # None to pick the first player at random on each reset
+        self.action_space = spaces.Discrete(COLS)
+        self.observation_space = spaces.Box(low=0, high=2, shape=(ROWS, COLS), dtype=np.int8)
+        self.board = Board()
+        self.bitboard = BitBoard()
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is not None:
+            self.rng = random.Random(seed)
+            # the default opponent draws from the generator of this environment, given opponents from their own
+            self.opponent_policy = get_opponent_policy(self.opponent, self.rng)
+        self.board = Board()
+        self.bitboard = BitBoard()
+        agent_starts = self.agent_starts if self.agent_starts is not None else self.rng.random() < 0.5
+        if not agent_starts:
+            self._play(self.opponent_policy(self.board, OPPONENT_PIECE), OPPONENT_PIECE)
+        return self._get_observation(), {'action_mask': self.action_masks()}
+
+    def step(self, action):
+        action = int(action)
+        if not self.bitboard.is_valid_location(action):
+            return self._get_observation(), -1.0, True, False, {'action_mask': self.action_masks(), 'invalid_action': True}
+
+        self._play(action, AGENT_PIECE)
+        if self.bitboard.check_for_win(AGENT_PIECE):
+            return self._get_observation(), 1.0, True, False, {'action_mask': self.action_masks()}
+        if self.bitboard.is_full():
+            return self._get_observation(), 0.0, True, False, {'action_mask': self.action_masks()}
+
+        col = self.opponent_policy(self.board, OPPONENT_PIECE)
+        self._play(col, OPPONENT_PIECE)
+        if self.bitboard.check_for_win(OPPONENT_PIECE):
+            return self._get_observation(), -1.0, True, False, {'action_mask': self.action_masks()}
+        return self._get_observation(), 0.0, self.bitboard.is_full(), False, {'action_mask': self.action_masks()}
+
+    def action_masks(self):
+        return np.array([self.bitboard.is_valid_location(col) for col in range(COLS)])
+
+    def render(self):
+        symbols = {0: '.', AGENT_PIECE: 'X', OPPONENT_PIECE: 'O'}
+        return '\n'.join(''.join(symbols[piece] for piece in row) for row in self.board.grid)
+
+    def _play(self, col, piece):
+        self.board.drop_piece(self.board.get_next_open_row(col), col, piece)
+        self.bitboard.make_move(col, piece)
+
+    def _get_observation(self):
+        return np.array(self.board.grid, dtype=np.int8)
+
+# Cells of the 69 windows of four in a row, as indices in the flattened grid
+WINDOWS = np.array(
+    [[r * COLS + c + i for i in range(4)] for r in range(ROWS) for c in range(COLS - 3)] +
+    [[(r + i) * COLS + c for i in range(4)] for r in range(ROWS - 3) for c in range(COLS)] +
+    [[(r + i) * COLS + c + i for i in range(4)] for r in range(ROWS - 3) for c in range(COLS - 3)] +
+    [[(r - i) * COLS + c + i for i in range(4)] for r in range(3, ROWS) for c in range(COLS - 3)]
+)
+
+class BatchedConnectFourEnv(gym.vector.VectorEnv):
+    """
+    n_envs games of ConnectFourEnv stored in one NumPy array and stepped together.
+    A SimpleComputerPlayer opponent is vectorized, other opponents are called on each game that needs a move.
+    Finished games are reset within the step, their last observation is in infos['final_obs'].
+    Like in gymnasium's vector environments, each info key comes with a '_'-prefixed mask of the games it is set for.
+    """
+    metadata = {'autoreset_mode': gym.vector.AutoresetMode.SAME_STEP, 'render_modes': []}
+
+    def __init__(self, n_envs=64, opponent=None, agent_starts=True):
+        self.num_envs = n_envs
+        self.opponent = opponent if opponent is not None else SimpleComputerPlayer()
+        self.opponent_policy = get_opponent_policy(self.opponent)
+        self.agent_starts = agent_starts
+        self.single_action_space = spaces.Discrete(COLS)
+        self.single_observation_space = spaces.Box(low=0, high=2, shape=(ROWS, COLS), dtype=np.int8)
+        self.action_space = gym.vector.utils.batch_space(self.single_action_space, n_envs)
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, n_envs)
+        self.boards = np.zeros((n_envs, ROWS, COLS), dtype=np.int8)
+        self.heights = np.zeros((n_envs, COLS), dtype=np.int64)  # number of pieces in each column
+        self.env_indices = np.arange(n_envs)
+        self.np_random = np.random.default_rng()
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.np_random = np.random.default_rng(seed)
+        self._reset_envs(self.env_indices)
+        return self.boards.copy(), {'action_mask': self.action_masks(), '_action_mask': np.ones(self.num_envs, dtype=bool)}
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+
+        # invalid moves lose the game
+        invalid = self.heights[self.env_indices, actions] >= ROWS
+        rewards[invalid] = -1.0
+        terminated |= invalid
+
+        playing = self.env_indices[~terminated]
+        self._play(playing, actions[playing], AGENT_PIECE)
+        won = self._check_for_win(playing, AGENT_PIECE)
+        rewards[playing[won]] = 1.0
+        terminated[playing[won]] = True
+        terminated[self._is_full(playing)] = True
+
+        playing = self.env_indices[~terminated]
+        self._play(playing, self._opponent_moves(playing), OPPONENT_PIECE)
+        lost = self._check_for_win(playing, OPPONENT_PIECE)
+        rewards[playing[lost]] = -1.0
+        terminated[playing[lost]] = True
+        terminated[self._is_full(playing)] = True
+
+        every_game = np.ones(self.num_envs, dtype=bool)
+        infos = {'invalid_action': invalid, '_invalid_action': every_game}
+        done = self.env_indices[terminated]
+        if len(done) > 0:
+            infos['final_obs'] = self.boards.copy()
+            infos['_final_obs'] = terminated.copy()
+            self._reset_envs(done)
+        infos['action_mask'] = self.action_masks()
+        infos['_action_mask'] = every_game
+        return self.boards.copy(), rewards, terminated, np.zeros(self.num_envs, dtype=bool), infos
+
+    def action_masks(self):
+        return self.heights < ROWS
+
+    def close(self, **kwargs):
+        return
+
+    def _reset_envs(self, indices):
+        self.boards[indices] = 0
+        self.heights[indices] = 0
+        if self.agent_starts is None:
+            opponent_starts = indices[self.np_random.random(len(indices)) < 0.5]
+        else:
+            opponent_starts = indices if not self.agent_starts else indices[:0]
+        self._play(opponent_starts, self._opponent_moves(opponent_starts), OPPONENT_PIECE)
+
+    def _play(self, indices, cols, piece):
+        rows = ROWS - 1 - self.heights[indices, cols]
+        self.boards[indices, rows, cols] = piece
+        self.heights[indices, cols] += 1
+
+    def _opponent_moves(self, indices):
+        if len(indices) == 0:
+            return np.zeros(0, dtype=np.int64)
+        if isinstance(self.opponent, SimpleComputerPlayer):
+            # uniform among the valid columns
+            scores = self.np_random.random((len(indices), COLS)) * (self.heights[indices] < ROWS)
+            return scores.argmax(axis=1)
+        moves = []
+        for idx in indices:
+            board = Board()
+            board.grid = self.boards[idx].tolist()
+            moves.append(self.opponent_policy(board, OPPONENT_PIECE))
+        return np.array(moves, dtype=np.int64)
+
+    def _check_for_win(self, indices, piece):
+        cells = self.boards[indices].reshape(len(indices), ROWS * COLS)[:, WINDOWS]
+        return (cells == piece).all(axis=2).any(axis=1)
+
+    def _is_full(self, indices):
+        return indices[(self.heights[indices] >= ROWS).all(axis=1)]
+
 # ---------------------------
 # Game Class
 # ---------------------------
 class ConnectFourGame:
     def __init__(self, mode='human_vs_computer', agent1=None, agent2=None):
+        # Initialize Pygame
+        pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Connect Four')
 
@@ -230,13 +668,13 @@ class ConnectFourGame:
 
     def display_winner(self):
         pygame.draw.rect(self.screen, BLACK, (0, 0, SCREEN_WIDTH, SQUARE_SIZE))
-        label = FONT.render(f'Player {3 - self.turn} wins!', True, RED if (3 - self.turn) == 1 else YELLOW)
+        label = get_font(30, 'Arial').render(f'Player {3 - self.turn} wins!', True, RED if (3 - self.turn) == 1 else YELLOW)
         self.screen.blit(label, (SCREEN_WIDTH // 2 - label.get_width() // 2, 10))
         pygame.display.update()
 
     def display_draw(self):
         pygame.draw.rect(self.screen, BLACK, (0, 0, SCREEN_WIDTH, SQUARE_SIZE))
-        label = FONT.render(f'Draw!', True, WHITE)
+        label = get_font(30, 'Arial').render(f'Draw!', True, WHITE)
         self.screen.blit(label, (SCREEN_WIDTH // 2 - label.get_width() // 2, 10))
         pygame.display.update()
 
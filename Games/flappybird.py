@@ -4,12 +4,12 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import os
+import time
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
-# Initialize PyGame
-pygame.init()
-
 # Game constants
 SCREEN_WIDTH = 288
 SCREEN_HEIGHT = 512
@@ -17,14 +17,17 @@ GRAVITY = 0.5
 BIRD_FLAP_VELOCITY = -7
 PIPE_SPEED = -3
 PIPE_GAP = 100
-PIPE_FREQUENCY = 3000  # milliseconds
+PIPE_FREQUENCY = 90  # steps, 3000 milliseconds at 30 frames per second
+PIPE_FREQUENCY_MS = 3000  # milliseconds, timer of the original game with wall_clock=True
 
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 BIRD_COLOR = (255, 255, 0)  # Yellow
 PIPE_COLOR = (0, 255, 0)    # Green
-FONT = pygame.font.SysFont(None, 25)
+# Wall clock in milliseconds, pygame.time.get_ticks() stays at 0 until pygame is initialized
+def get_ticks():
+    return int(time.monotonic() * 1000)
 
 class Bird:
     def __init__(self):
@@ -45,9 +48,10 @@ class Bird:
         pygame.draw.rect(game_display, BIRD_COLOR, (self.x, self.y, self.width, self.height))
 
 class Pipe:
-    def __init__(self):
+    def __init__(self, rng=random):
         self.x = SCREEN_WIDTH
-        self.top_height = random.randint(50, SCREEN_HEIGHT - PIPE_GAP - 50)
+        # random module or a seeded random.Random for the height of the gap
+        self.top_height = rng.randint(50, SCREEN_HEIGHT - PIPE_GAP - 50)
         self.bottom_height = SCREEN_HEIGHT - self.top_height - PIPE_GAP
         self.width = 52
         self.passed = False
@@ -61,21 +65,36 @@ class Pipe:
                         (self.x, SCREEN_HEIGHT - self.bottom_height, self.width, self.bottom_height))
 
 class FlappyBirdEnv(gym.Env):
-    def __init__(self):
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, render_mode='human', pipe_interval=None, wall_clock=False, profile=False):
         super().__init__()
         # Environment setup
         self.screen_width = SCREEN_WIDTH
         self.screen_height = SCREEN_HEIGHT
         self.pipe_gap = PIPE_GAP
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
+        # pipes are spawned every pipe_interval steps, so the game doesn't depend on the speed of the simulation.
+        # wall_clock=True is the compatibility mode with the original game, pipe_interval is then in milliseconds
+        self.wall_clock = wall_clock
+        if pipe_interval is None:
+            pipe_interval = PIPE_FREQUENCY_MS if wall_clock else PIPE_FREQUENCY
+        self.pipe_interval = pipe_interval
+        # random module until reset is given a seed, then a generator of this environment only
+        self.rng = random
         
         # Game objects
         self.bird = Bird()
         self.pipes = []
         self.score = 0
-        self.last_pipe_time = pygame.time.get_ticks()
+        self.steps = 0
+        self.last_pipe_time = self._pipe_clock()
         
         # Rendering
-        self.game_display = None
+        self.window = None
+        self.surface = None
         self.clock = pygame.time.Clock()
         
         # Gym spaces
@@ -87,21 +106,23 @@ class FlappyBirdEnv(gym.Env):
         )
 
     def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
         if seed is not None:
-            np.random.seed(seed)
-            random.seed(seed)
+            self.rng = random.Random(seed)
         
         # Reset bird
         self.bird = Bird()
         
         # Reset game state
-        self.pipes = [Pipe()]
+        self.pipes = [Pipe(self.rng)]
         self.score = 0
-        self.last_pipe_time = pygame.time.get_ticks()
+        self.steps = 0
+        self.last_pipe_time = self._pipe_clock()
         
         return self._get_observation(), {}
 
     def step(self, action):
+        self.profiler.start()
         # Handle action
         if action == 1:
             self.bird.flap()
@@ -110,9 +131,14 @@ class FlappyBirdEnv(gym.Env):
         self.bird.move()
 
         # Update pipes
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_pipe_time > PIPE_FREQUENCY:
-            self.pipes.append(Pipe())
+        self.steps += 1
+        current_time = self._pipe_clock()
+        if self.wall_clock:
+            spawn = current_time - self.last_pipe_time > self.pipe_interval  # strict, like the original game
+        else:
+            spawn = current_time - self.last_pipe_time >= self.pipe_interval
+        if spawn:
+            self.pipes.append(Pipe(self.rng))
             self.last_pipe_time = current_time
 
         for pipe in self.pipes:
@@ -120,6 +146,7 @@ class FlappyBirdEnv(gym.Env):
 
         # Remove off-screen pipes
         self.pipes = [pipe for pipe in self.pipes if pipe.x + pipe.width > 0]
+        self.profiler.lap('physics')
 
         # Calculate reward
         reward = 0.1  # Small reward for staying alive
@@ -128,36 +155,50 @@ class FlappyBirdEnv(gym.Env):
                 pipe.passed = True
                 self.score += 1
                 reward += 1.0  # Bonus for passing pipe
+        self.profiler.lap('reward')
 
         # Check if game is done
         done = self._check_collision()
         if done:
             reward = -1.0  # Penalty for dying
+        self.profiler.lap('collision')
 
-        return self._get_observation(), reward, done, False, {'score': self.score}
+        observation = self._get_observation()
+        self.profiler.lap('observation')
 
-    def render(self, mode='human'):
-        if self.game_display is None:
-            self.game_display = pygame.display.set_mode((self.screen_width, self.screen_height))
-            pygame.display.set_caption('Flappy Bird')
+        return observation, reward, done, False, {'score': self.score}
 
-        self.game_display.fill(BLACK)
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        game_display = get_render_surface(self, mode, (self.screen_width, self.screen_height), 'Flappy Bird')
+
+        game_display.fill(BLACK)
         
         # Draw game objects
-        self.bird.draw(self.game_display)
+        self.bird.draw(game_display)
         for pipe in self.pipes:
-            pipe.draw(self.game_display)
+            pipe.draw(game_display)
             
         # Draw score
-        score_text = FONT.render(f"Score: {self.score}", True, WHITE)
-        self.game_display.blit(score_text, (10, 10))
+        score_text = get_font(25).render(f"Score: {self.score}", True, WHITE)
+        game_display.blit(score_text, (10, 10))
+
+        if mode == 'rgb_array':
+            return surface_to_array(game_display)
         
         pygame.display.update()
         self.clock.tick(30)
 
     def close(self):
-        if self.game_display is not None:
-            pygame.quit()
+        close_window(self)
+
+    # helper function to get the time of the pipe timer, in steps or in milliseconds with wall_clock=True
+    def _pipe_clock(self):
+        return get_ticks() if self.wall_clock else self.steps
 
     def _get_observation(self):
         # Find the next pipe
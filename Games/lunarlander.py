@@ -4,6 +4,8 @@ import numpy as np
 import pygame
 import math
 import random
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_render_surface, close_window, surface_to_array
 
 # Constants
 SCREEN_WIDTH, SCREEN_HEIGHT = 600, 400
@@ -16,14 +18,16 @@ MAX_SPEED = 2.0
 FUEL_CONSUMPTION = 0.001
 
 class LunarLanderEnv(gym.Env):
-    metadata = {'render.modes': ['human']}
+    metadata = {'render_modes': RENDER_MODES}
 
-    def __init__(self):
+    def __init__(self, render_mode='human', profile=False):
         super(LunarLanderEnv, self).__init__()
 
-        # Initialize Pygame
-        pygame.init()
-        self.screen = None
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
+        self.window = None
+        self.surface = None
         self.clock = pygame.time.Clock()
 
         # Action space: Discrete [Do Nothing, Fire Main Engine, Fire Left Engine, Fire Right Engine]
@@ -73,6 +77,7 @@ class LunarLanderEnv(gym.Env):
             self.terrain_segments.append((start, end))
 
     def step(self, action):
+        self.profiler.start()
         reward = 0.0
 
         # Apply gravity
@@ -106,6 +111,7 @@ class LunarLanderEnv(gym.Env):
         if self.position[1] < 0:
             self.position[1] = 0
             self.velocity[1] = 0
+        self.profiler.lap('physics')
 
         # Check for landing or crash
         terrain_height = self._get_terrain_height(self.position[0])
@@ -123,13 +129,19 @@ class LunarLanderEnv(gym.Env):
 
         # Time penalty to encourage faster completion
         reward -= 0.1
+        self.profiler.lap('collision')
 
         self.total_reward += reward
         obs = self._get_observation()
         info = {}
+        self.profiler.lap('observation')
 
         return obs, reward, self.done, info
 
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
+
     def _get_terrain_height(self, x):
         # Interpolate terrain height at x
         for segment in self.terrain_segments:
@@ -156,14 +168,13 @@ class LunarLanderEnv(gym.Env):
             self.fuel
         ], dtype=np.float32)
 
-    def render(self, mode='human'):
-        if self.screen is None:
-            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-            pygame.display.set_caption("Lunar Lander")
-        self.screen.fill((0, 0, 0))  # Black background
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        screen = get_render_surface(self, mode, (SCREEN_WIDTH, SCREEN_HEIGHT), "Lunar Lander")
+        screen.fill((0, 0, 0))  # Black background
 
         # Draw terrain
-        pygame.draw.polygon(self.screen, (100, 100, 100), self.terrain + [(SCREEN_WIDTH, SCREEN_HEIGHT), (0, SCREEN_HEIGHT)])
+        pygame.draw.polygon(screen, (100, 100, 100), self.terrain + [(SCREEN_WIDTH, SCREEN_HEIGHT), (0, SCREEN_HEIGHT)])
 
         # Draw landing pad
         pad_y = self._get_terrain_height(self.landing_pad_x)
@@ -173,22 +184,23 @@ class LunarLanderEnv(gym.Env):
             self.landing_pad_width,
             10
         )
-        pygame.draw.rect(self.screen, (0, 255, 0), pad_rect)
+        pygame.draw.rect(screen, (0, 255, 0), pad_rect)
 
         # Draw lander
         lander_rect = pygame.Rect(0, 0, LANDER_WIDTH, LANDER_HEIGHT)
         lander_rect.center = (int(self.position[0]), int(self.position[1]))
-        pygame.draw.rect(self.screen, (255, 255, 255), lander_rect)
+        pygame.draw.rect(screen, (255, 255, 255), lander_rect)
 
         # Fuel gauge
         fuel_height = int(self.fuel * 50)
-        pygame.draw.rect(self.screen, (255, 0, 0), (10, 10 + 50 - fuel_height, 10, fuel_height))
+        pygame.draw.rect(screen, (255, 0, 0), (10, 10 + 50 - fuel_height, 10, fuel_height))
+
+        if mode == 'rgb_array':
+            return surface_to_array(screen)
 
         # Update display
         pygame.display.flip()
         self.clock.tick(60)
 
     def close(self):
-        if self.screen is not None:
-            pygame.quit()
-            self.screen = None
+        close_window(self)
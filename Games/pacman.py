@@ -5,6 +5,8 @@ import pygame
 import sys
 import os
 import random
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 
 # Define colors
 BLACK = (0, 0, 0)
@@ -23,15 +25,18 @@ SCREEN_HEIGHT = GRID_HEIGHT * GRID_SIZE
 FPS = 10
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
-pygame.init()
-FONT = pygame.font.SysFont('Arial', 14)
 
 class PacManEnv(gym.Env):
-    def __init__(self):
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, render_mode='human', profile=False):
         super(PacManEnv, self).__init__()
         self.grid_width = GRID_WIDTH
         self.grid_height = GRID_HEIGHT
         self.grid_size = GRID_SIZE
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
 
         # Define action space: 0-Up, 1-Right, 2-Down, 3-Left
         self.action_space = spaces.Discrete(4)
@@ -41,7 +46,8 @@ class PacManEnv(gym.Env):
         self.observation_space = spaces.Box(low=0, high=4, shape=(self.grid_height, self.grid_width), dtype=np.uint8)
 
         # Initialize Pygame elements
-        self.screen = None
+        self.window = None
+        self.surface = None
         self.clock = pygame.time.Clock()
 
         # Load maze layout
@@ -75,14 +81,19 @@ class PacManEnv(gym.Env):
         if self.done:
             return self.state, 0, self.done, {}
 
+        self.profiler.start()
         # Move Pac-Man
         reward = self._move_pacman(action)
+        self.profiler.lap('pacman')
 
         # Move ghosts
         self._move_ghosts()
+        self.profiler.lap('ghosts')
 
         # Check for collisions
-        if self._check_collision():
+        collision = self._check_collision()
+        self.profiler.lap('collision')
+        if collision:
             self.done = True
             reward -= 10  # Penalty for being caught by a ghost
             return self.state, reward, self.done, {'score': self.score}
@@ -95,12 +106,15 @@ class PacManEnv(gym.Env):
 
         return self.state, reward, self.done, {'score': self.score}
 
-    def render(self, mode='human'):
-        if self.screen is None:
-            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-            pygame.display.set_caption('Pac-Man')
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        screen = get_render_surface(self, mode, (SCREEN_WIDTH, SCREEN_HEIGHT), 'Pac-Man')
 
-        self.screen.fill(BLACK)
+        screen.fill(BLACK)
 
         for row in range(self.grid_height):
             for col in range(self.grid_width):
@@ -109,23 +123,25 @@ class PacManEnv(gym.Env):
                 y = row * self.grid_size
                 rect = pygame.Rect(x, y, self.grid_size, self.grid_size)
                 if value == 1:
-                    pygame.draw.rect(self.screen, WALL_COLOR, rect)
+                    pygame.draw.rect(screen, WALL_COLOR, rect)
                 elif value == 2:
-                    pygame.draw.circle(self.screen, PELLET_COLOR, rect.center, self.grid_size // 8)
+                    pygame.draw.circle(screen, PELLET_COLOR, rect.center, self.grid_size // 8)
                 elif value == 3:
-                    pygame.draw.circle(self.screen, PACMAN_COLOR, rect.center, self.grid_size // 2)
+                    pygame.draw.circle(screen, PACMAN_COLOR, rect.center, self.grid_size // 2)
                 elif value == 4:
-                    pygame.draw.circle(self.screen, GHOST_COLOR, rect.center, self.grid_size // 2)
+                    pygame.draw.circle(screen, GHOST_COLOR, rect.center, self.grid_size // 2)
+
+        score_text = get_font(14, 'Arial').render(f"Score: {self.score}", True, WHITE)
+        screen.blit(score_text, (5, 5))
+
+        if mode == 'rgb_array':
+            return surface_to_array(screen)
 
-        score_text = FONT.render(f"Score: {self.score}", True, WHITE)
-        self.screen.blit(score_text, (5, 5))
         pygame.display.flip()
         self.clock.tick(FPS)
 
     def close(self):
-        if self.screen is not None:
-            pygame.quit()
-            self.screen = None
+        close_window(self)
 
     def _load_maze(self):
         # Simple maze representation: 1-Wall, 0-Empty
@@ -1,9 +1,12 @@
 import pygame
 import sys
 import random
-
-# Initialize Pygame
-pygame.init()
+from collections import deque
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 
 # ---------------------------
 # Game Constants
@@ -26,9 +29,6 @@ BALL_SIZE = 10
 BALL_SPEED_X = 4
 BALL_SPEED_Y = 4
 
-# Font
-FONT = pygame.font.SysFont('Arial', 30)
-
 # ---------------------------
 # Paddle Class
 # ---------------------------
@@ -72,15 +72,16 @@ class Paddle:
 # Ball Class
 # ---------------------------
 class Ball:
-    def __init__(self):
+    def __init__(self, rng=random):
+        self.rng = rng  # random module or a seeded random.Random for the directions after each reset
         self.reset()
 
     def reset(self):
         self.x = SCREEN_WIDTH // 2 - BALL_SIZE // 2
         self.y = SCREEN_HEIGHT // 2 - BALL_SIZE // 2
         self.size = BALL_SIZE
-        self.speed_x = BALL_SPEED_X * random.choice((-1, 1))
-        self.speed_y = BALL_SPEED_Y * random.choice((-1, 1))
+        self.speed_x = BALL_SPEED_X * self.rng.choice((-1, 1))
+        self.speed_y = BALL_SPEED_Y * self.rng.choice((-1, 1))
 
     def update(self, paddle_left, paddle_right):
         self.x += self.speed_x
@@ -136,6 +137,8 @@ class AgentInterface:
 # ---------------------------
 class PongGame:
     def __init__(self, mode='human_vs_computer', agent_left=None, agent_right=None):
+        # Initialize Pygame
+        pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption('Pong')
 
@@ -210,7 +213,7 @@ class PongGame:
         self.ball.draw(self.screen)
 
         # Draw scores
-        score_text = FONT.render(f"{self.score_left} : {self.score_right}", True, WHITE)
+        score_text = get_font(30, 'Arial').render(f"{self.score_left} : {self.score_right}", True, WHITE)
         self.screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, 20))
 
         pygame.display.flip()
@@ -251,6 +254,261 @@ class RandomAgent(AgentInterface):
         """
         return random.choice(['up', 'down', 'none'])
 
+class InterceptPredictor:
+    """
+    Predicts in constant time the y of the ball when it reaches a paddle, assuming the opponent sends it back.
+    Between the walls the ball's y stays on the grid of step |speed_y| it started on, and turns at the first
+    point of that grid past each wall, so its y is a triangle wave between these two points.
+    The prediction is cached until the trajectory changes (new speed or serve).
+    """
+    def __init__(self):
+        self.cache_key = None
+        self.cache_value = None
+
+    def predict(self, x, y, speed_x, speed_y, paddle_x):
+        if speed_x == 0:
+            return None
+        left = paddle_x < SCREEN_WIDTH // 2
+        opponent_x = SCREEN_WIDTH - paddle_x - PADDLE_WIDTH
+        step = abs(speed_y)
+        if step == 0:
+            return None if self._steps_to_paddle(x, speed_x, paddle_x, opponent_x, left) is None else y
+
+        # turning points of the triangle wave and position on its unfolded period
+        top = y % step - step if y % step else 0
+        bottom = SCREEN_HEIGHT - BALL_SIZE + (y - (SCREEN_HEIGHT - BALL_SIZE)) % step
+        length = bottom - top
+        unfolded = y - top if speed_y > 0 else 2 * length - (y - top)
+
+        # the unfolded position moves by step when x moves by speed_x, so this is constant along a trajectory
+        key = (paddle_x, speed_x, step, top, (unfolded * speed_x - step * x) % (2 * length * abs(speed_x)))
+        if key != self.cache_key:
+            steps = self._steps_to_paddle(x, speed_x, paddle_x, opponent_x, left)
+            if steps is None:
+                self.cache_value = None
+            else:
+                unfolded = (unfolded + step * steps) % (2 * length)
+                self.cache_value = top + (unfolded if unfolded <= length else 2 * length - unfolded)
+            self.cache_key = key
+        return self.cache_value
+
+    # helper function to count the steps until the ball is in the x range of the paddle, through the opponent when moving away
+    def _steps_to_paddle(self, x, speed_x, paddle_x, opponent_x, left):
+        towards = (speed_x < 0) == left
+        if towards:
+            return self._steps_to_x(x, speed_x, paddle_x, left)
+        to_opponent = self._steps_to_x(x, speed_x, opponent_x, not left)
+        if to_opponent is None:
+            return None
+        back = self._steps_to_x(x + to_opponent * speed_x, -speed_x, paddle_x, left)
+        return None if back is None else to_opponent + back
+
+    # helper function to count the steps until the checks of Ball.update see the ball inside a paddle's x range
+    def _steps_to_x(self, x, speed_x, paddle_x, left):
+        if left:
+            # paddle.x < ball.x < paddle.x + width
+            distance = x - (paddle_x + PADDLE_WIDTH)
+        else:
+            # paddle.x < ball.x + size < paddle.x + width
+            distance = paddle_x - (x + BALL_SIZE)
+        if distance < 0:
+            return None  # already past the front of the paddle
+        return distance // abs(speed_x) + 1
+
+class PredictiveAgent(AgentInterface):
+    """
+    Moves towards the predicted interception point of the ball, waiting in the middle when the ball can't come back.
+    The agent sees the ball reaction_delay steps late, so it follows the old prediction for that long after each hit,
+    a larger delay makes a weaker opponent. It keeps the recent ball states, so use one agent per game.
+    The states are forgotten when the ball is served again, the agent sees the new ball at once.
+    """
+    def __init__(self, reaction_delay=0):
+        self.reaction_delay = reaction_delay
+        self.predictor = InterceptPredictor()
+        self.history = deque(maxlen=reaction_delay + 1)
+
+    def reset(self):
+        # forgets the ball states of the previous rally, called by the environments on reset
+        self.history.clear()
+
+    def act(self, paddle, ball):
+        # the ball moves by its speed on each step, a longer jump is a new serve
+        if self.history and abs(ball.x - self.history[-1][0]) > abs(ball.speed_x):
+            self.reset()
+        self.history.append((ball.x, ball.y, ball.speed_x, ball.speed_y))
+        x, y, speed_x, speed_y = self.history[0]
+        target = self.predictor.predict(x, y, speed_x, speed_y, paddle.x)
+        if target is None:
+            target = SCREEN_HEIGHT // 2 - BALL_SIZE // 2
+        offset = target + ball.size // 2 - (paddle.y + paddle.height / 2)
+        if offset < -paddle.speed / 2:
+            return 'up'
+        elif offset > paddle.speed / 2:
+            return 'down'
+        else:
+            return 'none'
+
+# ---------------------------
+# Training Environments
+# ---------------------------
+# Discrete actions of the environments, in the order of the agents' string actions
+ACTIONS = ['none', 'up', 'down']
+# Bounds of an observation: the ball goes past a wall by up to one move before it bounces, and its mirrored x
+# (measured from its right edge) past the left edge by up to its size
+BALL_MARGIN = max(BALL_SIZE, BALL_SPEED_X, BALL_SPEED_Y) / min(SCREEN_WIDTH, SCREEN_HEIGHT)
+OBSERVATION_LOW = np.array([-BALL_MARGIN, -BALL_MARGIN, -1.0, -1.0, 0.0, 0.0], dtype=np.float32)
+OBSERVATION_HIGH = np.array([1.0 + BALL_MARGIN, 1.0 + BALL_MARGIN, 1.0, 1.0, 1.0, 1.0], dtype=np.float32)
+
+def get_opponent_policy(opponent):
+    # agents are used through their act method, functions are called directly with (paddle, ball)
+    if opponent is None:
+        opponent = SimpleHeuristicAgent()
+    return opponent.act if hasattr(opponent, 'act') else opponent
+
+class TwoPlayerPongEnv(gym.Env):
+    """
+    Headless Pong where step takes the actions of both paddles (left, right), without any frame rate limit.
+    Observations and rewards are given per player, the right player's observation is mirrored so that both
+    players see themselves on the left: [ball x, ball y, ball speed x, ball speed y, own paddle y, opponent paddle y],
+    positions scaled by the screen size and speeds by the ball speed. A point is worth 1 to the scorer and -1 to the
+    other player, the episode ends when a player reaches points_to_win or after max_steps.
+    """
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, render_mode='human', points_to_win=21, max_steps=10000, profile=False):
+        super().__init__()
+        self.points_to_win = points_to_win
+        self.max_steps = max_steps
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
+        self.rng = random
+
+        self.action_space = spaces.MultiDiscrete([len(ACTIONS), len(ACTIONS)])
+        self.observation_space = spaces.Box(low=np.tile(OBSERVATION_LOW, (2, 1)), high=np.tile(OBSERVATION_HIGH, (2, 1)), dtype=np.float32)
+
+        # Rendering
+        self.window = None
+        self.surface = None
+        self.clock = pygame.time.Clock()
+
+        self._reset_game()
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self._reset_game()
+        return self._get_observation(), {}
+
+    def step(self, actions):
+        self.profiler.start()
+        left_action, right_action = actions
+        self._move(self.paddle_left, int(left_action))
+        self._move(self.paddle_right, int(right_action))
+        self.profiler.lap('paddles')
+
+        rewards = np.zeros(2, dtype=np.float32)
+        scorer = self.ball.update(self.paddle_left, self.paddle_right)
+        if scorer == 'left':
+            self.score_left += 1
+            rewards[:] = (1.0, -1.0)
+            self.ball.reset()
+        elif scorer == 'right':
+            self.score_right += 1
+            rewards[:] = (-1.0, 1.0)
+            self.ball.reset()
+        self.steps += 1
+        terminated = max(self.score_left, self.score_right) >= self.points_to_win
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        self.profiler.lap('ball')
+
+        observation = self._get_observation()
+        self.profiler.lap('observation')
+        return observation, rewards, terminated, truncated, {'score': (self.score_left, self.score_right)}
+
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        screen = get_render_surface(self, mode, (SCREEN_WIDTH, SCREEN_HEIGHT), 'Pong')
+
+        screen.fill(BLACK)
+        pygame.draw.aaline(screen, WHITE, (SCREEN_WIDTH // 2, 0), (SCREEN_WIDTH // 2, SCREEN_HEIGHT))
+        self.paddle_left.draw(screen)
+        self.paddle_right.draw(screen)
+        self.ball.draw(screen)
+        score_text = get_font(30, 'Arial').render(f"{self.score_left} : {self.score_right}", True, WHITE)
+        screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, 20))
+
+        if mode == 'rgb_array':
+            return surface_to_array(screen)
+
+        pygame.display.flip()
+        self.clock.tick(FPS)
+
+    def close(self):
+        close_window(self)
+
+    # helper function to place the paddles and the ball like a new PongGame
+    def _reset_game(self):
+        self.paddle_left = Paddle(20, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2)
+        self.paddle_right = Paddle(SCREEN_WIDTH - 20 - PADDLE_WIDTH, SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2)
+        self.ball = Ball(self.rng)
+        self.score_left = 0
+        self.score_right = 0
+        self.steps = 0
+
+    # helper function to apply a discrete action to a paddle
+    def _move(self, paddle, action):
+        if action == 1:
+            paddle.move_up()
+        elif action == 2:
+            paddle.move_down()
+
+    # helper function to get the observations of both players
+    def _get_observation(self):
+        ball = self.ball
+        x = ball.x / SCREEN_WIDTH
+        mirrored_x = (SCREEN_WIDTH - ball.size - ball.x) / SCREEN_WIDTH
+        y = ball.y / SCREEN_HEIGHT
+        speed_x = ball.speed_x / BALL_SPEED_X
+        speed_y = ball.speed_y / BALL_SPEED_Y
+        left = self.paddle_left.y / SCREEN_HEIGHT
+        right = self.paddle_right.y / SCREEN_HEIGHT
+        return np.array([
+            [x, y, speed_x, speed_y, left, right],
+            [mirrored_x, y, -speed_x, speed_y, right, left],
+        ], dtype=np.float32)
+
+class PongEnv(TwoPlayerPongEnv):
+    """
+    Single-agent Pong: the agent plays the left paddle and the opponent (an AgentInterface, or a function of
+    (paddle, ball) returning 'up', 'down' or 'none') the right one, by default a SimpleHeuristicAgent.
+    Actions are 0: none, 1: up, 2: down, the observation and reward are the left player's ones of TwoPlayerPongEnv.
+    """
+
+    def __init__(self, opponent=None, render_mode='human', points_to_win=21, max_steps=10000, profile=False):
+        super().__init__(render_mode=render_mode, points_to_win=points_to_win, max_steps=max_steps, profile=profile)
+        self.opponent = opponent
+        self.opponent_policy = get_opponent_policy(opponent)
+        self.action_space = spaces.Discrete(len(ACTIONS))
+        self.observation_space = spaces.Box(low=OBSERVATION_LOW, high=OBSERVATION_HIGH, dtype=np.float32)
+
+    def reset(self, seed=None, options=None):
+        observation, info = super().reset(seed=seed, options=options)
+        if hasattr(self.opponent, 'reset'):
+            self.opponent.reset()
+        return observation[0], info
+
+    def step(self, action):
+        # the opponent decides before the paddles move, like in PongGame.update
+        opponent_action = ACTIONS.index(self.opponent_policy(self.paddle_right, self.ball))
+        observation, rewards, terminated, truncated, info = super().step((action, opponent_action))
+        return observation[0], float(rewards[0]), terminated, truncated, info
+
 # ---------------------------
 # Main Function
 # ---------------------------
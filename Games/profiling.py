@@ -0,0 +1,35 @@
+import time
+
+
+class StepProfiler:
+    """
+    Records the cumulative time and number of calls of each phase of an environment's step function.
+    The step calls start() once, then lap(phase) at the end of each phase. When disabled both return
+    after a single check, so the instrumentation can stay in the step functions.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.times = {}
+        self.calls = {}
+        self.last_time = 0.0
+
+    def start(self):
+        if self.enabled:
+            self.last_time = time.perf_counter()
+
+    def lap(self, phase):
+        # attribute the time since the previous lap (or start) to this phase
+        if self.enabled:
+            now = time.perf_counter()
+            self.times[phase] = self.times.get(phase, 0.0) + now - self.last_time
+            self.calls[phase] = self.calls.get(phase, 0) + 1
+            self.last_time = now
+
+    def stats(self):
+        # cumulative time in seconds and number of calls per phase
+        return {phase: {'time': self.times[phase], 'calls': self.calls[phase]} for phase in self.times}
+
+    def reset(self):
+        self.times = {}
+        self.calls = {}
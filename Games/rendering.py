@@ -0,0 +1,50 @@
+import pygame
+import numpy as np
+
+# 'human' renders to a window, 'rgb_array' to an offscreen surface returned as an array
+RENDER_MODES = ['human', 'rgb_array']
+
+# fonts by (size, name), created on first use so that importing the game modules does not initialize pygame
+FONTS = {}
+
+
+def get_font(size, name=None):
+    """
+    Returns the system font of this size and name, None being pygame's default font.
+    """
+    if not pygame.font.get_init():
+        # the fonts don't survive pygame.quit(), which closing a window calls
+        FONTS.clear()
+        pygame.font.init()
+    key = (size, name)
+    if key not in FONTS:
+        FONTS[key] = pygame.font.SysFont(name, size)
+    return FONTS[key]
+
+
+def get_render_surface(env, mode, size, caption):
+    """
+    Returns the surface render() draws on, created on first use: env.surface, an offscreen surface that needs no window,
+    for 'rgb_array', or env.window for 'human', which initializes pygame and opens the window.
+    """
+    if mode == 'rgb_array':
+        if env.surface is None:
+            env.surface = pygame.Surface(size)
+        return env.surface
+    if env.window is None:
+        pygame.init()
+        env.window = pygame.display.set_mode(size)
+        pygame.display.set_caption(caption)
+    return env.window
+
+
+def close_window(env):
+    # quits pygame if render() opened a window
+    if env.window is not None:
+        pygame.quit()
+        env.window = None
+
+
+def surface_to_array(surface):
+    # pygame indexes the pixels by (x, y), the arrays of 'rgb_array' are (height, width, 3)
+    return np.transpose(pygame.surfarray.array3d(surface), axes=(1, 0, 2))
@@ -4,21 +4,20 @@ import gym
 from gym import spaces
 import numpy as np
 import os
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
-# Initialize PyGame
-pygame.init()
-
 # Define colors and font
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 RED = (255, 0, 0)
-FONT = pygame.font.SysFont(None, 25)
 
 # Define hyperparameters
 VISION = 5
 SCREEN_RATIO = 2
 MAX_STEPS = 150
+FOOD_ATTEMPTS = 8  # random draws before sampling the food among the free cells
 
 # Define the score class
 class Score:
@@ -26,13 +25,13 @@ class Score:
         self.value = 0
     
     def draw(self, game_display):
-        score_text = FONT.render("Score: " + str(self.value), True, WHITE)
+        score_text = get_font(25).render("Score: " + str(self.value), True, WHITE)
         game_display.blit(score_text, (10, 10))
     
 # Define the food class       
 class Food:
-    def __init__(self, num_cols, num_rows, scale):
-        self.position = (random.randint(0, num_cols-1), random.randint(0, num_rows-1))
+    def __init__(self, num_cols, num_rows, scale, rng=random):
+        self.position = (rng.randint(0, num_cols-1), rng.randint(0, num_rows-1))
         self.scale = scale
 
     def draw(self, game_display):
@@ -43,12 +42,18 @@ class Food:
 
 # Define the Snake sub-class
 class Snake:
-    def __init__(self, col, row, scale):
+    def __init__(self, col, row, scale, num_cols, num_rows):
         self.position = [(col, row)]  # Start at the center of the screen
         self.direction = 'up'
         self.previous_direction = 'up'
         self.scale = scale
         self.growth_position = (col, row - 1)
+        # occupancy grid: number of segments on each cell, padded with walls (1) so the vision window
+        # around the head always fits, even when the head just left the board
+        self.pad = VISION + 1
+        self.grid = np.ones((num_rows + 2*self.pad, num_cols + 2*self.pad), dtype=np.uint8)
+        self.grid[self.pad:self.pad+num_rows, self.pad:self.pad+num_cols] = 0
+        self.grid[row+self.pad, col+self.pad] += 1
 
     def move(self):
         # Move the snake based on its current direction
@@ -64,11 +69,15 @@ class Snake:
             col += 1
         self.position.insert(0, (col, row))
         self.growth_position = self.position.pop()
+        # Update the occupancy grid
+        self.grid[row+self.pad, col+self.pad] += 1
+        self.grid[self.growth_position[1]+self.pad, self.growth_position[0]+self.pad] -= 1
 
     def grow(self):
         # Add a new body segment to the snake
         tail = self.growth_position
         self.position.append(tail)
+        self.grid[tail[1]+self.pad, tail[0]+self.pad] += 1
     
     def draw(self, game_display):
         # Draw the snake on the game board
@@ -89,21 +98,29 @@ class Snake:
         self.previous_direction = self.direction
 
 class Game(gym.Env):
-    def __init__(self, width=640//SCREEN_RATIO, height=480//SCREEN_RATIO, scale=10):
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, width=640//SCREEN_RATIO, height=480//SCREEN_RATIO, scale=10, render_mode='human', profile=False):
         # Set up the game window
         self.screen_width = width
         self.screen_height = height
         self.scale = scale
+        self.render_mode = render_mode
+        self.window = None
+        self.surface = None
+        self.clock = pygame.time.Clock()
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
         # Calculate number of rows and columns
         self.num_rows = self.screen_height // self.scale
         self.num_cols = self.screen_width // self.scale
 
+        # random number generator used for the food, replaced by a seeded one in seed()
+        self.rng = random
+
         # Create the snake, food and score objects
-        self.snake = Snake(self.num_cols//2, self.num_rows//2, self.scale)
-        self.food = Food(self.num_cols, self.num_rows, self.scale)
-        # check if new food is not on the snake, redraw random position until then
-        while self.food.position in self.snake.position:
-            self.food = Food(self.num_cols, self.num_rows, self.scale)
+        self.snake = Snake(self.num_cols//2, self.num_rows//2, self.scale, self.num_cols, self.num_rows)
+        self.food = self._place_food()
         self.score = Score()
 
         # initialize reward and done
@@ -124,13 +141,15 @@ class Game(gym.Env):
         self.total_timesteps = 0
 
 
+    def seed(self, seed=None):
+        # Use a dedicated random number generator so that games are reproducible
+        self.rng = random.Random(seed)
+        return [seed]
+
     def reset(self):
         # Reset the snake, food and score
-        self.snake = Snake(self.num_cols//2, self.num_rows//2, self.scale)
-        self.food = Food(self.num_cols, self.num_rows, self.scale)
-        # check if new food is not on the snake, redraw random position until then
-        while self.food.position in self.snake.position:
-            self.food = Food(self.num_cols, self.num_rows, self.scale)
+        self.snake = Snake(self.num_cols//2, self.num_rows//2, self.scale, self.num_cols, self.num_rows)
+        self.food = self._place_food()
         self.score = Score()
         # Reset the timesteps
         self.timesteps = 0
@@ -143,6 +162,7 @@ class Game(gym.Env):
         return self.state
 
     def step(self, action=None):
+        self.profiler.start()
         # Handle events
         if action==None:
             for event in pygame.event.get():
@@ -162,27 +182,28 @@ class Game(gym.Env):
         # Move the snake
         self.snake.move()
         self.snake.update_previous_direction()
+        self.profiler.lap('move')
         
         # Check for collisions with the food
         self.reward = 0
         if self.snake.position[0] == self.food.position:
             self.snake.grow()
-            self.food = Food(self.num_cols, self.num_rows, self.scale)
-            # check if new food is not on the snake, redraw random position until then
-            while self.food.position in self.snake.position:
-                self.food = Food(self.num_cols, self.num_rows, self.scale)
+            self.food = self._place_food()
             self.score.value+=1
             self.reward+=10
             # reset timesteps of chasing food
             self.timesteps = 0
+        self.profiler.lap('food')
         
         # Check for collisions
         self.done = self._is_collision() or (self.timesteps > MAX_STEPS*len(self.snake.position))
         if self.done:
             self.reward-=10
+        self.profiler.lap('collision')
 
         # get new state
         self.state = self._get_state()
+        self.profiler.lap('observation')
 
         # update timesteps
         self.timesteps+=1
@@ -192,23 +213,30 @@ class Game(gym.Env):
         info = {'timesteps':self.total_timesteps}
 
         return self.state, self.reward, self.done, info
+
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
     
 
     def init_render(self):
-        # Set up the game display       
-        self.game_display = pygame.display.set_mode((self.screen_width, self.screen_height))
-        pygame.display.set_caption('Snake')
-        # Set up the clock
-        self.clock = pygame.time.Clock()
+        # Initialize PyGame and set up the game display
+        get_render_surface(self, 'human', (self.screen_width, self.screen_height), 'Snake')
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        game_display = get_render_surface(self, mode, (self.screen_width, self.screen_height), 'Snake')
 
-    def render(self):
         # Fill the game board with black
-        self.game_display.fill(BLACK)
+        game_display.fill(BLACK)
         
         # Draw the snake, food and score
-        self.snake.draw(self.game_display)
-        self.food.draw(self.game_display)
-        self.score.draw(self.game_display)
+        self.snake.draw(game_display)
+        self.food.draw(game_display)
+        self.score.draw(game_display)
+
+        if mode == 'rgb_array':
+            return surface_to_array(game_display)
         
         # Update the display
         pygame.display.update()
@@ -217,6 +245,9 @@ class Game(gym.Env):
         self.clock.tick(60)
         return
 
+    def close(self):
+        close_window(self)
+
     # helper function to check for collisions
     def _is_collision(self, point=None):
         if point is None:
@@ -224,34 +255,44 @@ class Game(gym.Env):
         # Check for collisions with the walls
         if point[0] < 0 or point[0] >= self.num_cols or point[1] < 0 or point[1] >= self.num_rows:
             return True
-        # Check for collisions with the snake's body
-        if point in self.snake.position[1:]:
-            return True
-        
-        return False
+        # Check for collisions with the snake's body, the occupancy grid also counts the head
+        segments = self.snake.grid[point[1]+self.snake.pad, point[0]+self.snake.pad]
+        if point == self.snake.position[0]:
+            segments -= 1
+        return segments > 0
+
+    # helper function to place new food on a cell that is not occupied by the snake
+    def _place_food(self):
+        # random draws are cheap while the board is mostly empty
+        for _ in range(FOOD_ATTEMPTS):
+            food = Food(self.num_cols, self.num_rows, self.scale, self.rng)
+            if not self.snake.grid[food.position[1]+self.snake.pad, food.position[0]+self.snake.pad]:
+                return food
+        # otherwise draw uniformly among the free cells, so the cost stays bounded when the board fills up
+        pad = self.snake.pad
+        free_cells = np.flatnonzero(self.snake.grid[pad:pad+self.num_rows, pad:pad+self.num_cols] == 0)
+        if len(free_cells) > 0:
+            cell = int(free_cells[self.rng.randrange(len(free_cells))])
+            food.position = (cell % self.num_cols, cell // self.num_cols)
+        return food
     
     # helper function to get the current state
     def _get_state(self):
         head = self.snake.position[0]
         col, row = head
-        # VISION**2-1 neighbouring points in a VISIONxVISION square (- head)
-        points = []
-        for i in range(-VISION,VISION+1):
-            for j in range(-VISION,VISION+1):
-                if (i,j)!=(0,0):
-                    point = (col+i, row+j)
-                    points.append(point)
+        # (2*VISION+1)**2-1 neighbouring points in a square around the head (- head), read from the occupancy grid:
+        # walls and the snake's body are the only occupied cells apart from the head
+        pad = self.snake.pad
+        window = self.snake.grid[row+pad-VISION:row+pad+VISION+1, col+pad-VISION:col+pad+VISION+1] > 0
+        # points are ordered column by column, the head is the center of the window
+        collisions = np.delete(window.T.ravel(), VISION*(2*VISION+1)+VISION)
         # direction
         is_direction_up = self.snake.direction == 'up'
         is_direction_right = self.snake.direction == 'right'
         is_direction_down = self.snake.direction == 'down'
         is_direction_left = self.snake.direction == 'left'
 
-        # collisions
-        state = [self._is_collision(point) for point in points]
-    
-        state.extend(
-            [
+        state = [
             # Directions
             is_direction_up,
             is_direction_down,
@@ -262,7 +303,6 @@ class Game(gym.Env):
             self.food.position[1] > head[1], # food is below (down) the snake
             self.food.position[0] < head[0], # food is left of the snake
             self.food.position[0] > head[0], # food is right of the snake
-            ]
-        )
+        ]
 
-        return np.array(state, dtype=int)
\ No newline at end of file
+        return np.concatenate([collisions, state]).astype(int)
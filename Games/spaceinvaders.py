@@ -4,19 +4,17 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 import os
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
-# Initialize PyGame
-pygame.init()
-
 # Define colors and font
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 PLAYER_COLOR = (0, 255, 0)  # Green player
 ENEMY_COLOR = (255, 0, 0)   # Red enemies
 BULLET_COLOR = (255, 255, 0) # Yellow bullets
-FONT = pygame.font.SysFont(None, 25)
 
 # Game constants
 SCREEN_WIDTH = 600
@@ -29,7 +27,7 @@ PLAYER_SPEED = 25
 ENEMY_SPEED = 1
 BULLET_SPEED = -10
 ENEMY_BULLET_SPEED = 5
-FIRE_DELAY = 500  # milliseconds
+FIRE_DELAY = 15  # steps, 500 milliseconds at 30 frames per second
 
 class Player:
     def __init__(self):
@@ -38,7 +36,7 @@ class Player:
         self.width = PLAYER_WIDTH
         self.height = PLAYER_HEIGHT
         self.speed = PLAYER_SPEED
-        self.last_fire_time = pygame.time.get_ticks()
+        self.last_fire_step = 0
         self.cooldown = FIRE_DELAY
 
     def move(self, direction):
@@ -49,12 +47,12 @@ class Player:
         # Boundary conditions
         self.x = max(0, min(self.x, SCREEN_WIDTH - self.width))
 
-    def can_fire(self):
-        current_time = pygame.time.get_ticks()
-        return current_time - self.last_fire_time >= self.cooldown
+    # the cooldown is counted in steps of the environment, so it doesn't depend on the speed of the simulation
+    def can_fire(self, step):
+        return step - self.last_fire_step >= self.cooldown
 
-    def fire(self):
-        self.last_fire_time = pygame.time.get_ticks()
+    def fire(self, step):
+        self.last_fire_step = step
         return Bullet(self.x + self.width // 2, self.y, BULLET_SPEED, 'player')
 
     def draw(self, game_display):
@@ -99,19 +97,26 @@ class Bullet:
         pygame.draw.rect(game_display, BULLET_COLOR, (self.x, self.y, self.width, self.height))
 
 class SpaceInvadersEnv(gym.Env):
-    def __init__(self):
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, render_mode='human', profile=False):
         super(SpaceInvadersEnv, self).__init__()
         self.screen_width = SCREEN_WIDTH
         self.screen_height = SCREEN_HEIGHT
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
         self.player = Player()
         self.enemies = self._create_enemies()
         self.player_bullets = []
         self.enemy_bullets = []
         self.score = 0
         self.done = False
-        self.game_display = None
+        self.window = None
+        self.surface = None
         self.clock = pygame.time.Clock()
-        self.last_enemy_fire_time = pygame.time.get_ticks()
+        self.steps = 0
+        self.last_enemy_fire_step = 0
 
         # Define action and observation space
         # Actions: 0 - Move Left, 1 - Move Right, 2 - Fire, 3 - Do Nothing
@@ -132,11 +137,15 @@ class SpaceInvadersEnv(gym.Env):
         self.enemy_bullets = []
         self.score = 0
         self.done = False
+        self.steps = 0
+        self.last_enemy_fire_step = 0
         state = self._get_state()
         return state
 
     def step(self, action):
+        self.profiler.start()
         reward = 0
+        self.steps += 1
 
         # Handle action
         if action == 0:  # Move Left
@@ -144,8 +153,8 @@ class SpaceInvadersEnv(gym.Env):
         elif action == 1:  # Move Right
             self.player.move(1)
         elif action == 2:  # Fire
-            if self.player.can_fire():
-                bullet = self.player.fire()
+            if self.player.can_fire(self.steps):
+                bullet = self.player.fire(self.steps)
                 self.player_bullets.append(bullet)
         # else: Do Nothing
 
@@ -165,9 +174,11 @@ class SpaceInvadersEnv(gym.Env):
 
         # Enemies fire bullets
         self._enemy_fire()
+        self.profiler.lap('physics')
 
         # Check for collisions
         reward += self._check_collisions()
+        self.profiler.lap('collision')
 
         # Check for game over conditions
         if not any(enemy.alive for enemy in self.enemies):
@@ -177,35 +188,43 @@ class SpaceInvadersEnv(gym.Env):
         if self._check_player_hit():
             self.done = True  # Player loses
             reward -= 100  # Penalty for losing
+        self.profiler.lap('game_over')
 
         # Get state
         state = self._get_state()
         info = {'score': self.score}
+        self.profiler.lap('observation')
 
         return state, reward, self.done, info
 
-    def render(self, mode='human'):
-        if self.game_display is None:
-            self.game_display = pygame.display.set_mode((self.screen_width, self.screen_height))
-            pygame.display.set_caption('Space Invaders')
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
 
-        self.game_display.fill(BLACK)
-        self.player.draw(self.game_display)
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        game_display = get_render_surface(self, mode, (self.screen_width, self.screen_height), 'Space Invaders')
+
+        game_display.fill(BLACK)
+        self.player.draw(game_display)
         for enemy in self.enemies:
             if enemy.alive:
-                enemy.draw(self.game_display)
+                enemy.draw(game_display)
         for bullet in self.player_bullets:
-            bullet.draw(self.game_display)
+            bullet.draw(game_display)
         for bullet in self.enemy_bullets:
-            bullet.draw(self.game_display)
-        score_text = FONT.render("Score: " + str(self.score), True, WHITE)
-        self.game_display.blit(score_text, (10, 10))
+            bullet.draw(game_display)
+        score_text = get_font(25).render("Score: " + str(self.score), True, WHITE)
+        game_display.blit(score_text, (10, 10))
+
+        if mode == 'rgb_array':
+            return surface_to_array(game_display)
+
         pygame.display.update()
         self.clock.tick(30)
 
     def close(self):
-        if self.game_display is not None:
-            pygame.quit()
+        close_window(self)
 
     def _get_state(self):
         # State includes positions of player, enemies, and bullets
@@ -279,11 +298,10 @@ class SpaceInvadersEnv(gym.Env):
         return enemies
 
     def _enemy_fire(self):
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_enemy_fire_time > FIRE_DELAY:
+        if self.steps - self.last_enemy_fire_step >= FIRE_DELAY:
             alive_enemies = [enemy for enemy in self.enemies if enemy.alive]
             if alive_enemies:
                 enemy = random.choice(alive_enemies)
                 bullet = enemy.fire()
                 self.enemy_bullets.append(bullet)
-            self.last_enemy_fire_time = current_time
\ No newline at end of file
+            self.last_enemy_fire_step = self.steps
\ No newline at end of file
@@ -1,9 +1,11 @@
 import pygame
 import random
 import sys
-
-# Initialize Pygame
-pygame.init()
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from profiling import StepProfiler
+from rendering import RENDER_MODES, get_font, get_render_surface, close_window, surface_to_array
 
 # ---------------------------
 # Game Constants
@@ -18,6 +20,8 @@ GRID_HEIGHT = SCREEN_HEIGHT // BLOCK_SIZE
 
 # Frames per second
 FPS = 60
+# Frames between two automatic falls, 0.5 seconds at 60 FPS
+GRAVITY_FRAMES = 30
 
 # Colors
 BLACK = (0, 0, 0)
@@ -136,6 +140,23 @@ SHAPES = [
       '.....']],
 ]
 
+# Offsets (dx, dy) of the blocks from the piece position for each shape and rotation, parsed once from the patterns
+BLOCK_OFFSETS = [[[(j - 2, i - 4) for i, row in enumerate(pattern) for j, cell in enumerate(row) if cell == 'O']
+                  for pattern in shape] for shape in SHAPES]
+
+# helper function to turn the blocks of a rotation into bitmasks: (min dx, max dx, [(dy, bits of the row from min dx)])
+def get_row_masks(offsets):
+    min_dx = min(dx for dx, _ in offsets)
+    max_dx = max(dx for dx, _ in offsets)
+    rows = {}
+    for dx, dy in offsets:
+        rows[dy] = rows.get(dy, 0) | 1 << (dx - min_dx)
+    return min_dx, max_dx, sorted(rows.items())
+
+ROW_MASKS = [[get_row_masks(offsets) for offsets in rotations] for rotations in BLOCK_OFFSETS]
+FULL_ROW = (1 << GRID_WIDTH) - 1
+COLUMN_INDICES = np.arange(GRID_WIDTH)
+
 # ---------------------------
 # Tetromino Class
 # ---------------------------
@@ -144,7 +165,8 @@ class Tetromino:
         self.x = x
         self.y = y
         self.shape = shape
-        self.color = COLORS[SHAPES.index(shape)]
+        self.shape_index = SHAPES.index(shape)
+        self.color = COLORS[self.shape_index]
         self.rotation = 0
 
     def image(self):
@@ -154,19 +176,16 @@ class Tetromino:
         self.rotation = (self.rotation + 1) % len(self.shape)
 
     def get_blocks(self):
-        blocks = []
-        pattern = self.image()
-        for i, row in enumerate(pattern):
-            for j, cell in enumerate(row):
-                if cell == 'O':
-                    blocks.append((self.x + j - 2, self.y + i - 4))
-        return blocks
+        return [(self.x + dx, self.y + dy) for dx, dy in BLOCK_OFFSETS[self.shape_index][self.rotation % len(self.shape)]]
 
 # ---------------------------
 # Game Class
 # ---------------------------
 class Tetris:
-    def __init__(self):
+    def __init__(self, rng=random):
+        self.rng = rng  # random module or a seeded random.Random for the sequence of pieces
+        # the cells of each row as a bitmask (bit x for column x) for the collisions, and their colors for the rendering
+        self.rows = [0] * GRID_HEIGHT
         self.grid = [[BLACK for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
         self.current_piece = self.get_new_piece()
         self.next_piece = self.get_new_piece()
@@ -174,16 +193,25 @@ class Tetris:
         self.game_over = False
         self.lock_delay = 0
 
+    def board_array(self):
+        # locked cells as a (GRID_HEIGHT, GRID_WIDTH) boolean array
+        return (np.array(self.rows)[:, None] >> COLUMN_INDICES & 1).astype(bool)
+
     def get_new_piece(self):
-        shape = random.choice(SHAPES)
+        shape = self.rng.choice(SHAPES)
         return Tetromino(GRID_WIDTH // 2, 0, shape)
 
     def valid_position(self, piece, adj_x=0, adj_y=0):
-        for block in piece.get_blocks():
-            x, y = block[0] + adj_x, block[1] + adj_y
-            if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT:
+        min_dx, max_dx, row_masks = ROW_MASKS[piece.shape_index][piece.rotation % len(piece.shape)]
+        left = piece.x + adj_x + min_dx
+        if left < 0 or piece.x + adj_x + max_dx >= GRID_WIDTH:
+            return False
+        top = piece.y + adj_y
+        for dy, bits in row_masks:
+            y = top + dy
+            if y >= GRID_HEIGHT:
                 return False
-            if y >= 0 and self.grid[y][x] != BLACK:
+            if y >= 0 and self.rows[y] & bits << left:
                 return False
         return True
 
@@ -191,6 +219,7 @@ class Tetris:
         for block in self.current_piece.get_blocks():
             x, y = block
             if y >= 0:
+                self.rows[y] |= 1 << x
                 self.grid[y][x] = self.current_piece.color
         self.clear_lines()
         self.current_piece = self.next_piece
@@ -199,12 +228,12 @@ class Tetris:
             self.game_over = True
 
     def clear_lines(self):
-        lines_cleared = 0
-        new_grid = [row for row in self.grid if any(cell == BLACK for cell in row)]
-        lines_cleared = GRID_HEIGHT - len(new_grid)
-        for _ in range(lines_cleared):
-            new_grid.insert(0, [BLACK for _ in range(GRID_WIDTH)])
-        self.grid = new_grid
+        # full rows are removed from both layers and the rows above them move down
+        kept = [y for y in range(GRID_HEIGHT) if self.rows[y] != FULL_ROW]
+        lines_cleared = GRID_HEIGHT - len(kept)
+        if lines_cleared:
+            self.rows = [0] * lines_cleared + [self.rows[y] for y in kept]
+            self.grid = [[BLACK for _ in range(GRID_WIDTH)] for _ in range(lines_cleared)] + [self.grid[y] for y in kept]
         self.score += lines_cleared * 100
 
     def move(self, dx, dy):
@@ -236,7 +265,7 @@ class Renderer:
     def __init__(self, screen, game):
         self.screen = screen
         self.game = game
-        self.font = pygame.font.SysFont('Arial', 24)
+        self.font = get_font(24, 'Arial')
 
     def draw_grid(self):
         for y in range(GRID_HEIGHT):
@@ -297,12 +326,15 @@ class Renderer:
         label = self.font.render(f'Score: {self.game.score}', True, WHITE)
         self.screen.blit(label, (SCREEN_WIDTH + 20, 200))
 
-    def render(self):
+    def draw(self):
         self.screen.fill(BLACK)
         self.draw_grid()
         self.draw_piece(self.game.current_piece)
         self.draw_next_piece()
         self.draw_score()
+
+    def render(self):
+        self.draw()
         pygame.display.flip()
 
 # ---------------------------
@@ -329,6 +361,8 @@ class AgentInterface:
 # Main Game Loop
 # ---------------------------
 def main(agent=None):
+    # Initialize Pygame
+    pygame.init()
     screen_width = SCREEN_WIDTH + 200  # Extra space for next piece and score
     screen_height = SCREEN_HEIGHT
     screen = pygame.display.set_mode((screen_width, screen_height))
@@ -339,12 +373,12 @@ def main(agent=None):
     renderer = Renderer(screen, game)
     agent_interface = AgentInterface(game) if agent else None
 
-    fall_time = 0
-    fall_speed = 0.5  # seconds
+    # the pieces fall on a count of frames, clock.tick only paces the display
+    frame = 0
 
     while not game.game_over:
-        dt = clock.tick(FPS) / 1000  # Delta time in seconds
-        fall_time += dt
+        clock.tick(FPS)
+        frame += 1
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -378,8 +412,7 @@ def main(agent=None):
                 game.hard_drop()
 
         # Handle automatic falling
-        if fall_time >= fall_speed:
-            fall_time = 0
+        if frame % GRAVITY_FRAMES == 0:
             game.update()
 
         renderer.render()
@@ -399,6 +432,289 @@ class SimpleAgent:
         # Simple agent that moves the piece to the left
         return 'left'
 
+# ---------------------------
+# Training Environment
+# ---------------------------
+# Actions of the 'frame' mode, in the order of the agents' string actions
+FRAME_ACTIONS = ['none', 'left', 'right', 'down', 'rotate', 'drop']
+MAX_ROTATIONS = max(len(shape) for shape in SHAPES)
+
+class TetrisEnv(gym.Env):
+    """
+    Headless Tetris on top of the Tetris class.
+    - action_mode='frame': one of FRAME_ACTIONS per frame, the piece falls by one row every gravity_frames frames.
+    - action_mode='placement': rotation * GRID_WIDTH + column, the current piece is rotated, moved so that its leftmost
+      block is in the column (as far as it can go) and hard dropped. action_masks() flags the distinct reachable placements.
+    The observation holds the locked cells and the cells of the current piece as (GRID_HEIGHT, GRID_WIDTH) arrays and the
+    indices of the current and next shapes. The reward is the number of lines cleared by the step.
+    """
+    metadata = {'render_modes': RENDER_MODES}
+
+    def __init__(self, action_mode='placement', render_mode='human', gravity_frames=GRAVITY_FRAMES, max_steps=None, profile=False):
+        super().__init__()
+        if action_mode not in ('frame', 'placement'):
+            raise ValueError(f"action_mode must be 'frame' or 'placement', not {action_mode!r}")
+        self.action_mode = action_mode
+        self.gravity_frames = gravity_frames
+        self.max_steps = max_steps
+        self.render_mode = render_mode
+        # opt-in timing of the phases of step, see stats()
+        self.profiler = StepProfiler(profile)
+        self.rng = random
+
+        if action_mode == 'frame':
+            self.action_space = spaces.Discrete(len(FRAME_ACTIONS))
+        else:
+            self.action_space = spaces.Discrete(MAX_ROTATIONS * GRID_WIDTH)
+        self.observation_space = spaces.Dict({
+            'board': spaces.Box(low=0, high=1, shape=(GRID_HEIGHT, GRID_WIDTH), dtype=np.int8),
+            'piece': spaces.Box(low=0, high=1, shape=(GRID_HEIGHT, GRID_WIDTH), dtype=np.int8),
+            'current_shape': spaces.Discrete(len(SHAPES)),
+            'next_shape': spaces.Discrete(len(SHAPES)),
+        })
+
+        # Rendering
+        self.window = None
+        self.surface = None
+        self.renderer = None
+        self.clock = pygame.time.Clock()
+
+        self.game = Tetris(self.rng)
+        self.steps = 0
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.game = Tetris(self.rng)
+        self.renderer = None
+        self.steps = 0
+        return self._get_observation(), {'action_mask': self.action_masks()}
+
+    def step(self, action):
+        self.profiler.start()
+        game = self.game
+        score = game.score
+        if self.action_mode == 'frame':
+            self._apply_frame_action(FRAME_ACTIONS[int(action)])
+        else:
+            piece = game.current_piece
+            placed = self._resolve_placement(action)
+            piece.rotation, piece.x = placed.rotation, placed.x
+            game.hard_drop()
+        self.steps += 1
+        self.profiler.lap('game')
+
+        reward = (game.score - score) / 100
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        observation = self._get_observation()
+        info = {'score': game.score, 'action_mask': self.action_masks()}
+        self.profiler.lap('observation')
+        return observation, reward, game.game_over, truncated, info
+
+    def action_masks(self):
+        if self.action_mode == 'frame':
+            return np.ones(len(FRAME_ACTIONS), dtype=bool)
+        mask = np.zeros(MAX_ROTATIONS * GRID_WIDTH, dtype=bool)
+        piece = self.game.current_piece
+        for rotation in range(len(piece.shape)):
+            for column in range(GRID_WIDTH):
+                placed = self._resolve_placement(rotation * GRID_WIDTH + column)
+                mask[rotation * GRID_WIDTH + column] = (placed.rotation == (piece.rotation + rotation) % len(piece.shape) and
+                                                        placed.x + ROW_MASKS[piece.shape_index][placed.rotation][0] == column)
+        return mask
+
+    def stats(self):
+        # cumulative time and number of calls of each phase of step, empty unless created with profile=True
+        return self.profiler.stats()
+
+    def render(self, mode=None):
+        mode = mode or self.render_mode
+        size = (SCREEN_WIDTH + 200, SCREEN_HEIGHT)  # Extra space for next piece and score
+        screen = get_render_surface(self, mode, size, 'Tetris')
+        if self.renderer is None or self.renderer.screen is not screen:
+            self.renderer = Renderer(screen, self.game)
+
+        self.renderer.draw()
+        if mode == 'rgb_array':
+            return surface_to_array(screen)
+
+        pygame.display.flip()
+        self.clock.tick(FPS)
+
+    def close(self):
+        close_window(self)
+
+    # helper function to apply a frame action then the automatic fall, like an iteration of main()
+    def _apply_frame_action(self, action):
+        game = self.game
+        if action == 'left':
+            game.move(-1, 0)
+        elif action == 'right':
+            game.move(1, 0)
+        elif action == 'down':
+            game.move(0, 1)
+        elif action == 'rotate':
+            game.rotate()
+        elif action == 'drop':
+            game.hard_drop()
+        if self.gravity_frames and (self.steps + 1) % self.gravity_frames == 0 and not game.game_over:
+            game.update()
+
+    # helper function to get the current piece rotated and moved towards the column of a placement, without dropping it
+    def _resolve_placement(self, action):
+        rotation, column = divmod(int(action), GRID_WIDTH)
+        piece = self.game.current_piece
+        placed = Tetromino(piece.x, piece.y, piece.shape)
+        placed.rotation = piece.rotation
+        # rotations and moves are blocked like the ones of the Tetris class
+        for _ in range(rotation % len(piece.shape)):
+            previous_rotation = placed.rotation
+            placed.rotate()
+            if not self.game.valid_position(placed):
+                placed.rotation = previous_rotation
+        dx = column - (placed.x + ROW_MASKS[piece.shape_index][placed.rotation][0])
+        direction = 1 if dx > 0 else -1
+        for _ in range(abs(dx)):
+            if not self.game.valid_position(placed, direction, 0):
+                break
+            placed.x += direction
+        return placed
+
+    # helper function to get the board, the current piece and the shapes as arrays
+    def _get_observation(self):
+        game = self.game
+        board = game.board_array().astype(np.int8)
+        piece = np.zeros((GRID_HEIGHT, GRID_WIDTH), dtype=np.int8)
+        for x, y in game.current_piece.get_blocks():
+            if 0 <= y < GRID_HEIGHT:
+                piece[y, x] = 1
+        return {
+            'board': board,
+            'piece': piece,
+            'current_shape': game.current_piece.shape_index,
+            'next_shape': game.next_piece.shape_index,
+        }
+
+# ---------------------------
+# Placement Search
+# ---------------------------
+# helper function to list the placements of a shape that fit between the walls: rotations, piece x, leftmost columns and block offsets
+def get_placement_candidates(shape_index):
+    rotations, xs, columns, offsets = [], [], [], []
+    for rotation, blocks in enumerate(BLOCK_OFFSETS[shape_index]):
+        min_dx, max_dx, _ = ROW_MASKS[shape_index][rotation]
+        for x in range(-min_dx, GRID_WIDTH - max_dx):
+            rotations.append(rotation)
+            xs.append(x)
+            columns.append(x + min_dx)
+            offsets.append(blocks)
+    return np.array(rotations), np.array(xs), np.array(columns), np.array(offsets)
+
+PLACEMENT_CANDIDATES = [get_placement_candidates(shape_index) for shape_index in range(len(SHAPES))]
+ROW_INDICES = np.arange(GRID_HEIGHT)
+
+def get_afterstates(boards, shape_index, spawn_x=GRID_WIDTH // 2, spawn_y=0):
+    """
+    Returns every legal placement of a shape on each of the boards ((GRID_HEIGHT, GRID_WIDTH) or a batch of them),
+    computed together with NumPy. Placements are the ones of TetrisEnv's placement mode: the piece is rotated at the
+    spawn position, slid to its column and hard dropped. The result is a dict of arrays with one entry per placement:
+    board_index, rotation, column (leftmost block), action (for TetrisEnv), boards (after the line clears),
+    lines_cleared, holes (empty cells below the top of their column), aggregate_height, bumpiness (sum of the
+    height differences of neighbouring columns) and topped_out (blocks left above the grid).
+    """
+    boards = np.asarray(boards, dtype=bool)
+    if boards.ndim == 2:
+        boards = boards[None]
+    rotations, xs, columns, offsets = PLACEMENT_CANDIDATES[shape_index]
+    block_xs = xs[:, None] + offsets[:, :, 0]
+    block_dys = offsets[:, :, 1]
+
+    # pieces that fit at the spawn row, the cells above the grid are free
+    spawn_rows = spawn_y + block_dys
+    occupied = boards[:, np.clip(spawn_rows, 0, GRID_HEIGHT - 1), block_xs] & (spawn_rows >= 0)
+    fits = ~occupied.any(axis=2) & (spawn_rows < GRID_HEIGHT).all(axis=1)
+
+    # reachable: every rotation up to this one fits at the spawn x, and every x between the spawn x and this one
+    reachable = np.zeros_like(fits)
+    rotated = np.ones(len(boards), dtype=bool)
+    for rotation in range(len(SHAPES[shape_index])):
+        indices = np.flatnonzero(rotations == rotation)
+        spawn = spawn_x - xs[indices[0]]
+        if not 0 <= spawn < len(indices):
+            break
+        row_fits = fits[:, indices]
+        rotated &= row_fits[:, spawn]
+        right = np.logical_and.accumulate(row_fits[:, spawn:], axis=1)
+        left = np.logical_and.accumulate(row_fits[:, spawn::-1], axis=1)[:, :0:-1]
+        reachable[:, indices] = np.concatenate([left, right], axis=1) & rotated[:, None]
+    board_index, candidate = np.nonzero(reachable)
+
+    # drop: each block stops above the first filled cell of its column below its spawn row
+    next_filled = np.where(boards, ROW_INDICES[None, :, None], GRID_HEIGHT)
+    next_filled = np.minimum.accumulate(next_filled[:, ::-1], axis=1)[:, ::-1]
+    next_filled = np.concatenate([next_filled, np.full((len(boards), 1, GRID_WIDTH), GRID_HEIGHT)], axis=1)
+    start_rows = np.clip(spawn_rows[candidate], 0, GRID_HEIGHT)
+    cell_xs = block_xs[candidate]
+    dys = block_dys[candidate]
+    landing = (next_filled[board_index[:, None], start_rows, cell_xs] - dys - 1).min(axis=1)
+
+    # lock the pieces, the blocks above the grid are lost like in Tetris.lock_piece
+    cell_ys = landing[:, None] + dys
+    inside = cell_ys >= 0
+    after = boards[board_index]
+    placement_index = np.repeat(np.arange(len(candidate)), 4).reshape(-1, 4)
+    after[placement_index[inside], cell_ys[inside], cell_xs[inside]] = True
+
+    # clear the full rows: they are moved to the top, in a stable order for the others, then emptied
+    full = after.all(axis=2)
+    lines_cleared = full.sum(axis=1)
+    order = np.argsort(~full, axis=1, kind='stable')
+    after = np.take_along_axis(after, order[:, :, None], axis=1)
+    after[ROW_INDICES[None, :] < lines_cleared[:, None]] = False
+
+    heights = np.where(after.any(axis=1), GRID_HEIGHT - after.argmax(axis=1), 0)
+    holes = (np.logical_or.accumulate(after, axis=1) & ~after).sum(axis=(1, 2))
+    return {
+        'board_index': board_index,
+        'rotation': rotations[candidate],
+        'column': columns[candidate],
+        'action': rotations[candidate] * GRID_WIDTH + columns[candidate],
+        'boards': after,
+        'lines_cleared': lines_cleared,
+        'holes': holes,
+        'aggregate_height': heights.sum(axis=1),
+        'bumpiness': np.abs(np.diff(heights, axis=1)).sum(axis=1),
+        'topped_out': ~inside.all(axis=1),
+    }
+
+class PlacementSearchAgent:
+    """
+    Picks the TetrisEnv placement action with the best weighted sum of afterstate features, looking at the placements
+    of the next piece too (two-piece lookahead). The default weights are a known good linear evaluation.
+    """
+    def __init__(self, weights=None, lookahead=True):
+        self.weights = weights or {'aggregate_height': -0.510066, 'lines_cleared': 0.760666, 'holes': -0.35663, 'bumpiness': -0.184483}
+        self.lookahead = lookahead
+
+    def act(self, observation):
+        first = get_afterstates(observation['board'], int(observation['current_shape']))
+        if len(first['action']) == 0:
+            return 0
+        scores = self._evaluate(first)
+        if self.lookahead:
+            second = get_afterstates(first['boards'], int(observation['next_shape']))
+            # best follow-up of each first placement, the lines of the first placement still count
+            best = np.full(len(first['action']), -np.inf)
+            np.maximum.at(best, second['board_index'], self._evaluate(second) + self.weights['lines_cleared'] * first['lines_cleared'][second['board_index']])
+            scores = np.where(np.isfinite(best), best, scores - 1000)
+        return int(first['action'][np.argmax(scores)])
+
+    # helper function to score afterstates, placements leaving blocks above the grid lose
+    def _evaluate(self, afterstates):
+        score = sum(weight * afterstates[feature] for feature, weight in self.weights.items())
+        return np.where(afterstates['topped_out'], -np.inf, score)
+
 # ---------------------------
 # Run the Game
 # ---------------------------
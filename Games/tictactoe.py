@@ -1,9 +1,9 @@
 import pygame
 import sys
 import random
-
-# Initialize Pygame
-pygame.init()
+import os
+import numpy as np
+from rendering import get_font
 
 # ---------------------------
 # Game Constants
@@ -11,6 +11,8 @@ pygame.init()
 SCREEN_WIDTH = 300
 SCREEN_HEIGHT = 300
 GRID_SIZE = 3
+# (row, col) steps along a row, a column and the two diagonals
+LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
 SQUARE_SIZE = SCREEN_WIDTH // GRID_SIZE
 LINE_WIDTH = 5
 FPS = 60
@@ -21,48 +23,66 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 
-# Font
-FONT = pygame.font.SysFont('Arial', 30)
-
 # ---------------------------
 # Game Board Class
 # ---------------------------
 class Board:
-    def __init__(self):
-        self.grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+    """
+    m,n,k-game board: rows x cols cells, k in a row wins (3, 3, 3 is Tic Tac Toe, 15, 15, 5 is Gomoku).
+    The winner is updated after each move by looking only along the four lines through it, and moves can be undone.
+    """
+    def __init__(self, rows=GRID_SIZE, cols=GRID_SIZE, k=GRID_SIZE):
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.reset()
 
     def reset(self):
-        self.grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.int8)
+        # (row, col, winner before the move) of each move, for undo
+        self.history = []
+        self.winner = None
 
     def is_valid_move(self, row, col):
-        return self.grid[row][col] == 0
+        return self.grid[row, col] == 0
+
+    def valid_moves(self):
+        return [(int(r), int(c)) for r, c in np.argwhere(self.grid == 0)]
 
     def make_move(self, row, col, player):
         if self.is_valid_move(row, col):
-            self.grid[row][col] = player
+            self.grid[row, col] = player
+            self.history.append((row, col, self.winner))
+            if self.winner is None and self._is_winning_move(row, col, player):
+                self.winner = player
             return True
         return False
 
-    def check_winner(self):
-        # Check rows, columns, and diagonals
-        for i in range(GRID_SIZE):
-            if all(self.grid[i][j] == self.grid[i][0] != 0 for j in range(GRID_SIZE)):
-                return self.grid[i][0]
-            if all(self.grid[j][i] == self.grid[0][i] != 0 for j in range(GRID_SIZE)):
-                return self.grid[0][i]
-
-        # Check diagonals
-        if all(self.grid[i][i] == self.grid[0][0] != 0 for i in range(GRID_SIZE)):
-            return self.grid[0][0]
-        if all(self.grid[i][GRID_SIZE - i - 1] == self.grid[0][GRID_SIZE - 1] != 0 for i in range(GRID_SIZE)):
-            return self.grid[0][GRID_SIZE - 1]
+    def undo_move(self):
+        row, col, self.winner = self.history.pop()
+        self.grid[row, col] = 0
 
+    def check_winner(self):
+        if self.winner is not None:
+            return self.winner
         # Check for draw
-        if all(self.grid[i][j] != 0 for i in range(GRID_SIZE) for j in range(GRID_SIZE)):
+        if len(self.history) == self.rows * self.cols:
             return 'draw'
-
         return None
 
+    # helper function to check if the last move completes k in a row, along the row, column and diagonals through it
+    def _is_winning_move(self, row, col, player):
+        for dr, dc in LINE_DIRECTIONS:
+            count = 1
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < self.rows and 0 <= c < self.cols and self.grid[r, c] == player:
+                    count += 1
+                    r, c = r + sign * dr, c + sign * dc
+            if count >= self.k:
+                return True
+        return False
+
 # ---------------------------
 # Agent Interface
 # ---------------------------
@@ -80,21 +100,172 @@ class AgentInterface:
 class SimpleComputerPlayer(AgentInterface):
     def act(self, board, player):
         # Simple AI that picks a random available spot
-        available_moves = [(r, c) for r in range(GRID_SIZE) for c in range(GRID_SIZE) if board.is_valid_move(r, c)]
+        available_moves = board.valid_moves()
         if available_moves:
             return random.choice(available_moves)
         return None
 
+# ---------------------------
+# Perfect Play Table
+# ---------------------------
+NUM_CELLS = GRID_SIZE * GRID_SIZE
+NUM_STATES = 3 ** NUM_CELLS  # each cell is empty (0), player 1 or player 2
+CELL_WEIGHTS = 3 ** np.arange(NUM_CELLS)
+# rows and columns interleaved then diagonals, the first complete line gives the winner
+LINES = ([line for i in range(GRID_SIZE) for line in ([i * GRID_SIZE + j for j in range(GRID_SIZE)], [j * GRID_SIZE + i for j in range(GRID_SIZE)])] +
+         [[i * GRID_SIZE + i for i in range(GRID_SIZE)], [i * GRID_SIZE + GRID_SIZE - 1 - i for i in range(GRID_SIZE)]])
+# The 8 symmetries of the square as permutations of the cells: symmetric[i] = cells[permutation[i]]
+_rotation = [(GRID_SIZE - 1 - c) * GRID_SIZE + r for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+_reflection = [r * GRID_SIZE + GRID_SIZE - 1 - c for r in range(GRID_SIZE) for c in range(GRID_SIZE)]
+SYMMETRIES = [list(range(NUM_CELLS))]
+for _ in range(3):
+    SYMMETRIES.append([SYMMETRIES[-1][i] for i in _rotation])
+SYMMETRIES += [[symmetry[i] for i in _reflection] for symmetry in SYMMETRIES]
+TABLE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tictactoe_table.npz')
+DRAW = 3  # winner code of a full board without a line
+
+def cells_winner(cells):
+    for line in LINES:
+        first = cells[line[0]]
+        if first != 0 and all(cells[i] == first for i in line):
+            return first
+    return DRAW if all(cells) else 0
+
+class PerfectPlayTable:
+    """
+    Minimax value and best move of every position reachable by either player moving first, indexed by the
+    base-3 number of the grid plus NUM_STATES when player 2 is to move, and the winner of every grid.
+    Values are from the point of view of the player to move: 1 + empty cells for a win (faster is better),
+    the opposite for a loss and 0 for a draw. The table is solved once and cached to disk.
+    """
+    def __init__(self, cache_path=TABLE_CACHE_PATH):
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as table:
+                self.values, self.best_moves, self.winners = table['values'], table['best_moves'], table['winners']
+        else:
+            self._solve()
+            if cache_path:
+                # written under a temporary name then renamed, several processes may solve the table at once
+                temp_path = f'{cache_path}.{os.getpid()}.tmp'
+                with open(temp_path, 'wb') as f:
+                    np.savez_compressed(f, values=self.values, best_moves=self.best_moves, winners=self.winners)
+                os.replace(temp_path, cache_path)
+
+    @staticmethod
+    def index(board, player):
+        if (board.rows, board.cols, board.k) != (GRID_SIZE, GRID_SIZE, GRID_SIZE):
+            raise ValueError(f"The perfect play table is for {GRID_SIZE}x{GRID_SIZE} Tic Tac Toe, not a {board.rows},{board.cols},{board.k}-game")
+        index = int(np.dot(board.grid.ravel(), CELL_WEIGHTS))
+        return index + NUM_STATES if player == 2 else index
+
+    def value(self, board, player):
+        return int(self.values[self.index(board, player)])
+
+    def best_move(self, board, player):
+        move = int(self.best_moves[self.index(board, player)])
+        return None if move < 0 else divmod(move, GRID_SIZE)
+
+    def winner(self, board):
+        # winner of the whole grid, same results as Board.check_winner in a game
+        winner = int(self.winners[self.index(board, 1)])
+        if winner == DRAW:
+            return 'draw'
+        return winner or None
+
+    def _solve(self):
+        # winners of all the grids at once
+        digits = (np.arange(NUM_STATES)[:, None] // CELL_WEIGHTS) % 3
+        winners = np.zeros(NUM_STATES, dtype=np.int8)
+        winners[(digits != 0).all(axis=1)] = DRAW
+        # in reverse so that the first complete line overwrites the others
+        for line in reversed(LINES):
+            first = digits[:, line[0]]
+            complete = (first != 0) & (digits[:, line] == first[:, None]).all(axis=1)
+            winners[complete] = first[complete]
+        self.winners = winners
+
+        # minimax on the positions up to symmetry
+        memo = {}
+        def canonical(cells, player):
+            return min(sum(cells[i] * int(CELL_WEIGHTS[j]) for j, i in enumerate(symmetry)) for symmetry in SYMMETRIES), player
+        def solve(cells, player):
+            key = canonical(cells, player)
+            if key not in memo:
+                winner = cells_winner(cells)
+                if winner == DRAW:
+                    memo[key] = 0
+                elif winner:
+                    score = 1 + cells.count(0)
+                    memo[key] = score if winner == player else -score
+                else:
+                    best = None
+                    for i in range(NUM_CELLS):
+                        if cells[i] == 0:
+                            value = -solve(cells[:i] + (player,) + cells[i + 1:], 3 - player)
+                            best = value if best is None else max(best, value)
+                    memo[key] = best
+            return memo[key]
+
+        # best moves of all the reachable positions, the children values come from the memo
+        self.values = np.zeros(2 * NUM_STATES, dtype=np.int8)
+        self.best_moves = np.full(2 * NUM_STATES, -1, dtype=np.int8)
+        stack = [((0,) * NUM_CELLS, 1), ((0,) * NUM_CELLS, 2)]
+        seen = set()
+        while stack:
+            cells, player = stack.pop()
+            index = sum(cell * int(weight) for cell, weight in zip(cells, CELL_WEIGHTS)) + (NUM_STATES if player == 2 else 0)
+            if index in seen:
+                continue
+            seen.add(index)
+            self.values[index] = solve(cells, player)
+            if cells_winner(cells):
+                continue
+            best_value = None
+            for i in range(NUM_CELLS):
+                if cells[i] == 0:
+                    child = cells[:i] + (player,) + cells[i + 1:]
+                    value = -solve(child, 3 - player)
+                    if best_value is None or value > best_value:
+                        best_value = value
+                        self.best_moves[index] = i
+                    stack.append((child, 3 - player))
+
+_perfect_play_table = None
+
+def get_perfect_play_table():
+    # the table is loaded (or solved) on first use and shared by all the agents
+    global _perfect_play_table
+    if _perfect_play_table is None:
+        _perfect_play_table = PerfectPlayTable()
+    return _perfect_play_table
+
+class PerfectAgent(AgentInterface):
+    """
+    Plays a best move from the perfect play table: never loses, wins as fast as possible.
+    """
+    def __init__(self):
+        self.table = get_perfect_play_table()
+
+    def act(self, board, player):
+        return self.table.best_move(board, player)
+
 # ---------------------------
 # Game Class
 # ---------------------------
 class TicTacToeGame:
-    def __init__(self, mode='human_vs_computer', agent1=None, agent2=None):
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    def __init__(self, mode='human_vs_computer', agent1=None, agent2=None, rows=GRID_SIZE, cols=GRID_SIZE, k=GRID_SIZE):
+        # squares fit in the screen whatever the size of the board
+        self.square_size = min(SCREEN_WIDTH // cols, SCREEN_HEIGHT // rows)
+        self.width = cols * self.square_size
+        self.height = rows * self.square_size
+
+        # Initialize Pygame
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
         pygame.display.set_caption('Tic Tac Toe')
 
         self.clock = pygame.time.Clock()
-        self.board = Board()
+        self.board = Board(rows, cols, k)
         self.mode = mode
         self.turn = 1  # Player 1 starts as X, Player 2 as O
         self.game_over = False
@@ -113,9 +284,9 @@ class TicTacToeGame:
             if not ((self.turn == 1 and self.agent1) or (self.turn == 2 and self.agent2)):
                 if event.type == pygame.MOUSEBUTTONDOWN and not self.game_over:
                     pos = event.pos
-                    row = pos[1] // SQUARE_SIZE
-                    col = pos[0] // SQUARE_SIZE
-                    if self.board.is_valid_move(row, col):
+                    row = pos[1] // self.square_size
+                    col = pos[0] // self.square_size
+                    if row < self.board.rows and col < self.board.cols and self.board.is_valid_move(row, col):
                         self.make_move(row, col)
 
     def make_move(self, row, col):
@@ -142,25 +313,28 @@ class TicTacToeGame:
 
     def draw_board(self):
         self.screen.fill(WHITE)
+        square = self.square_size
+        margin = square // 5
         # Draw grid lines
-        for i in range(1, GRID_SIZE):
-            pygame.draw.line(self.screen, BLACK, (0, i * SQUARE_SIZE), (SCREEN_WIDTH, i * SQUARE_SIZE), LINE_WIDTH)
-            pygame.draw.line(self.screen, BLACK, (i * SQUARE_SIZE, 0), (i * SQUARE_SIZE, SCREEN_HEIGHT), LINE_WIDTH)
+        for i in range(1, self.board.rows):
+            pygame.draw.line(self.screen, BLACK, (0, i * square), (self.width, i * square), LINE_WIDTH)
+        for i in range(1, self.board.cols):
+            pygame.draw.line(self.screen, BLACK, (i * square, 0), (i * square, self.height), LINE_WIDTH)
 
         # Draw X's and O's
-        for r in range(GRID_SIZE):
-            for c in range(GRID_SIZE):
+        for r in range(self.board.rows):
+            for c in range(self.board.cols):
                 if self.board.grid[r][c] == 1:
                     pygame.draw.line(self.screen, RED,
-                                     (c * SQUARE_SIZE + 20, r * SQUARE_SIZE + 20),
-                                     ((c + 1) * SQUARE_SIZE - 20, (r + 1) * SQUARE_SIZE - 20), LINE_WIDTH)
+                                     (c * square + margin, r * square + margin),
+                                     ((c + 1) * square - margin, (r + 1) * square - margin), LINE_WIDTH)
                     pygame.draw.line(self.screen, RED,
-                                     ((c + 1) * SQUARE_SIZE - 20, r * SQUARE_SIZE + 20),
-                                     (c * SQUARE_SIZE + 20, (r + 1) * SQUARE_SIZE - 20), LINE_WIDTH)
+                                     ((c + 1) * square - margin, r * square + margin),
+                                     (c * square + margin, (r + 1) * square - margin), LINE_WIDTH)
                 elif self.board.grid[r][c] == 2:
                     pygame.draw.circle(self.screen, BLUE,
-                                       (c * SQUARE_SIZE + SQUARE_SIZE // 2, r * SQUARE_SIZE + SQUARE_SIZE // 2),
-                                       SQUARE_SIZE // 2 - 15, LINE_WIDTH)
+                                       (c * square + square // 2, r * square + square // 2),
+                                       square * 7 // 20, LINE_WIDTH)
         pygame.display.update()
 
     def run(self):
@@ -174,12 +348,12 @@ class TicTacToeGame:
         pygame.time.wait(3000)  # Wait for 3 seconds before closing
 
     def display_winner(self, winner):
-        pygame.draw.rect(self.screen, WHITE, (0, SCREEN_HEIGHT // 2 - 30, SCREEN_WIDTH, 60))
+        pygame.draw.rect(self.screen, WHITE, (0, self.height // 2 - 30, self.width, 60))
         if winner == 'draw':
-            label = FONT.render('Draw!', True, BLACK)
+            label = get_font(30, 'Arial').render('Draw!', True, BLACK)
         else:
-            label = FONT.render(f'Player {winner} wins!', True, RED if winner == 1 else BLUE)
-        self.screen.blit(label, (SCREEN_WIDTH // 2 - label.get_width() // 2, SCREEN_HEIGHT // 2 - label.get_height() // 2))
+            label = get_font(30, 'Arial').render(f'Player {winner} wins!', True, RED if winner == 1 else BLUE)
+        self.screen.blit(label, (self.width // 2 - label.get_width() // 2, self.height // 2 - label.get_height() // 2))
         pygame.display.update()
 
 # ---------------------------
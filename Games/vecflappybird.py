@@ -0,0 +1,191 @@
+import random
+import numpy as np
+import gymnasium as gym
+from gymnasium import spaces
+from flappybird import (SCREEN_WIDTH, SCREEN_HEIGHT, GRAVITY, BIRD_FLAP_VELOCITY, PIPE_SPEED, PIPE_GAP, PIPE_FREQUENCY,
+                        FlappyBirdEnv)
+
+# same as the Bird and Pipe classes
+BIRD_X = SCREEN_WIDTH // 6
+BIRD_START_Y = SCREEN_HEIGHT // 2
+BIRD_WIDTH = 34
+BIRD_HEIGHT = 24
+PIPE_WIDTH = 52
+PIPE_MIN_TOP = 50
+PIPE_MAX_TOP = SCREEN_HEIGHT - PIPE_GAP - 50
+# number of moves after which a pipe has left the screen
+PIPE_LIFETIME = -(-(SCREEN_WIDTH + PIPE_WIDTH) // -PIPE_SPEED)
+
+
+class VecFlappyBird(gym.vector.VectorEnv):
+    """
+    Vectorized FlappyBirdEnv, advances n_envs birds with NumPy arrays in a single step call.
+    The pipes of each game are kept in a fixed-capacity ring buffer, a pipe is spawned every pipe_interval steps
+    in the oldest slot, which has left the screen by then, and the collisions are tested on all slots at once.
+    Pipe heights come from one generator for all games, or with parity=True from a random.Random per game,
+    in which case the observations, rewards and dones match FlappyBirdEnv seeded with seed + index.
+    Finished games are reset within the step, their last observation is in infos['final_obs'].
+    Like in gymnasium's vector environments, each info key comes with a '_'-prefixed mask of the games it is set for.
+    """
+    metadata = {'autoreset_mode': gym.vector.AutoresetMode.SAME_STEP, 'render_modes': []}
+
+    def __init__(self, n_envs=1024, pipe_interval=PIPE_FREQUENCY, parity=False):
+        self.num_envs = n_envs
+        self.pipe_interval = pipe_interval
+        self.parity = parity
+        self.single_action_space = spaces.Discrete(2)
+        self.single_observation_space = spaces.Box(
+            low=np.array([0, -np.inf, 0, 0], dtype=np.float32),
+            high=np.array([SCREEN_HEIGHT, np.inf, SCREEN_WIDTH, SCREEN_HEIGHT], dtype=np.float32),
+            dtype=np.float32
+        )
+        self.action_space = gym.vector.utils.batch_space(self.single_action_space, n_envs)
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, n_envs)
+
+        self.bird_y = np.zeros(n_envs, dtype=np.float64)
+        self.velocity = np.zeros(n_envs, dtype=np.float64)
+        self.score = np.zeros(n_envs, dtype=np.int64)
+        self.steps = np.zeros(n_envs, dtype=np.int64)
+        self.last_pipe_step = np.zeros(n_envs, dtype=np.int64)
+        # ring buffer of pipes, one row per game, next_slot is where the next pipe is written. A pipe is on screen
+        # for PIPE_LIFETIME moves (one more for the pipe of the reset, which isn't moved in its first step)
+        self.capacity = PIPE_LIFETIME // max(pipe_interval, 1) + 1
+        self.pipe_x = np.zeros((n_envs, self.capacity), dtype=np.int64)
+        self.pipe_top = np.zeros((n_envs, self.capacity), dtype=np.int64)
+        self.pipe_alive = np.zeros((n_envs, self.capacity), dtype=bool)
+        self.pipe_passed = np.zeros((n_envs, self.capacity), dtype=bool)
+        self.next_slot = np.zeros(n_envs, dtype=np.int64)
+        self.slot_indices = np.arange(self.capacity)
+        self.env_indices = np.arange(n_envs)
+        self.np_random = np.random.default_rng()
+        self.rngs = [random for _ in range(n_envs)]
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            # each game gets its own generator in parity mode, seeded like FlappyBirdEnv.reset(seed=seed + index)
+            self.np_random = np.random.default_rng(seed)
+            self.rngs = [random.Random(seed + idx) for idx in range(self.num_envs)]
+        self._reset_envs(self.env_indices)
+        return self._get_observation(), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        self.velocity = np.where(actions == 1, BIRD_FLAP_VELOCITY, self.velocity) + GRAVITY
+        self.bird_y += self.velocity
+
+        # pipes, in the order of FlappyBirdEnv.step: spawn, move, then drop the ones that left the screen
+        self.steps += 1
+        spawning = self.steps - self.last_pipe_step >= self.pipe_interval
+        if spawning.any():
+            spawned = self.env_indices[spawning]
+            self._spawn_pipes(spawned)
+            self.last_pipe_step[spawned] = self.steps[spawned]
+        self.pipe_x += PIPE_SPEED
+        self.pipe_alive &= self.pipe_x + PIPE_WIDTH > 0
+
+        passed = self.pipe_alive & ~self.pipe_passed & (self.pipe_x + PIPE_WIDTH < BIRD_X)
+        self.pipe_passed |= passed
+        passed_count = passed.sum(axis=1)
+        self.score += passed_count
+        rewards = (0.1 + passed_count).astype(np.float32)
+
+        terminated = self._check_collision()
+        rewards[terminated] = -1.0
+
+        observations = self._get_observation()
+        infos = {'score': self.score.copy(), '_score': np.ones(self.num_envs, dtype=bool)}
+        done = self.env_indices[terminated]
+        if len(done) > 0:
+            infos['final_obs'] = observations.copy()
+            infos['_final_obs'] = terminated.copy()
+            self._reset_envs(done)
+            observations[done] = self._get_observation()[done]
+        return observations, rewards, terminated, np.zeros(self.num_envs, dtype=bool), infos
+
+    def close(self, **kwargs):
+        return
+
+    def _reset_envs(self, indices):
+        self.bird_y[indices] = BIRD_START_Y
+        self.velocity[indices] = 0.0
+        self.score[indices] = 0
+        self.steps[indices] = 0
+        self.last_pipe_step[indices] = 0
+        self.pipe_alive[indices] = False
+        self._spawn_pipes(indices)
+
+    # helper function to write a new pipe at the right edge of the screen in the next slot of each game
+    def _spawn_pipes(self, indices):
+        slots = self.next_slot[indices]
+        self.pipe_x[indices, slots] = SCREEN_WIDTH
+        self.pipe_top[indices, slots] = self._pipe_tops(indices)
+        self.pipe_alive[indices, slots] = True
+        self.pipe_passed[indices, slots] = False
+        self.next_slot[indices] = (slots + 1) % self.capacity
+
+    # helper function to draw the heights of new pipes, same random draws as Pipe in parity mode
+    def _pipe_tops(self, indices):
+        if self.parity:
+            return [self.rngs[idx].randint(PIPE_MIN_TOP, PIPE_MAX_TOP) for idx in indices]
+        return self.np_random.integers(PIPE_MIN_TOP, PIPE_MAX_TOP + 1, size=len(indices))
+
+    # helper function to test the birds against the ground, the ceiling and the rectangles of the pipes
+    def _check_collision(self):
+        crashed = (self.bird_y <= 0) | (self.bird_y + BIRD_HEIGHT >= SCREEN_HEIGHT)
+        # pygame.Rect truncates the coordinates, the birds still in play are below 0
+        bird_top = np.floor(self.bird_y)[:, None]
+        overlap_x = self.pipe_alive & (self.pipe_x < BIRD_X + BIRD_WIDTH) & (BIRD_X < self.pipe_x + PIPE_WIDTH)
+        outside_gap = (bird_top < self.pipe_top) | (bird_top + BIRD_HEIGHT > self.pipe_top + PIPE_GAP)
+        return crashed | (overlap_x & outside_gap).any(axis=1)
+
+    # helper function to get the observations of FlappyBirdEnv, with the oldest pipe not yet behind each bird
+    def _get_observation(self):
+        ahead = self.pipe_alive & (self.pipe_x + PIPE_WIDTH >= BIRD_X)
+        if self.pipe_interval > 1:
+            nearest = np.where(ahead, self.pipe_x, SCREEN_WIDTH + 1).argmin(axis=1)
+        else:
+            # the pipe of the reset and the first spawned one share their x, the oldest comes first like in the list
+            # of FlappyBirdEnv, the ring buffer holds the pipes by age from next_slot on
+            age = (self.slot_indices - self.next_slot[:, None]) % self.capacity
+            nearest = np.where(ahead, self.pipe_x * self.capacity + age, (SCREEN_WIDTH + 1) * self.capacity).argmin(axis=1)
+        has_pipe = ahead.any(axis=1)
+        observations = np.empty((self.num_envs, 4), dtype=np.float32)
+        observations[:, 0] = self.bird_y
+        observations[:, 1] = self.velocity
+        observations[:, 2] = np.where(has_pipe, self.pipe_x[self.env_indices, nearest] - BIRD_X, SCREEN_WIDTH)
+        observations[:, 3] = np.where(has_pipe, self.pipe_top[self.env_indices, nearest], SCREEN_HEIGHT / 2)
+        return observations
+
+
+def check_parity(n_envs=8, n_steps=20000, seed=0, pipe_interval=PIPE_FREQUENCY):
+    """
+    Steps VecFlappyBird in parity mode and n_envs FlappyBirdEnv with the same seeds and actions, raises an AssertionError
+    on the first difference. The birds flap when they are below the gap of the next pipe, with random flaps and misses
+    so that they hit the pipes, the ground and the ceiling.
+    """
+    vec_env = VecFlappyBird(n_envs, pipe_interval=pipe_interval, parity=True)
+    observations, _ = vec_env.reset(seed=seed)
+    envs = [FlappyBirdEnv(render_mode=None, pipe_interval=pipe_interval) for _ in range(n_envs)]
+    env_observations = [env.reset(seed=seed + idx)[0] for idx, env in enumerate(envs)]
+    assert np.array_equal(observations, np.array(env_observations)), "observations differ after reset"
+
+    action_rng = np.random.default_rng(seed)
+    for step in range(n_steps):
+        below_gap = observations[:, 0] > observations[:, 3] + PIPE_GAP / 2
+        actions = (below_gap ^ (action_rng.random(n_envs) < 0.05)).astype(np.int64)
+        observations, rewards, terminated, truncated, infos = vec_env.step(actions)
+        for idx, env in enumerate(envs):
+            observation, reward, done, _, info = env.step(actions[idx])
+            if done:
+                assert np.array_equal(infos['final_obs'][idx], observation), f"final observations differ in env {idx} at step {step}"
+                observation, _ = env.reset()
+            assert np.array_equal(observations[idx], observation), f"observations differ in env {idx} at step {step}"
+            assert rewards[idx] == np.float32(reward) and terminated[idx] == done, f"rewards or dones differ in env {idx} at step {step}"
+            assert infos['score'][idx] == info['score'], f"scores differ in env {idx} at step {step}"
+
+
+if __name__ == '__main__':
+    check_parity()
+    check_parity(pipe_interval=10)
+    check_parity(pipe_interval=1)
+    print('VecFlappyBird matches FlappyBirdEnv')
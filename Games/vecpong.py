@@ -0,0 +1,217 @@
+import copy
+import random
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from pong import (SCREEN_WIDTH, SCREEN_HEIGHT, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_SPEED, BALL_SIZE, BALL_SPEED_X, BALL_SPEED_Y,
+                  ACTIONS, OBSERVATION_LOW, OBSERVATION_HIGH, Paddle, Ball, PongEnv, SimpleHeuristicAgent, PredictiveAgent,
+                  get_opponent_policy)
+
+LEFT_PADDLE_X = 20
+RIGHT_PADDLE_X = SCREEN_WIDTH - 20 - PADDLE_WIDTH
+PADDLE_START_Y = SCREEN_HEIGHT // 2 - PADDLE_HEIGHT // 2
+BALL_START_X = SCREEN_WIDTH // 2 - BALL_SIZE // 2
+BALL_START_Y = SCREEN_HEIGHT // 2 - BALL_SIZE // 2
+
+
+class VecPong(VecEnv):
+    """
+    Vectorized PongEnv, advances n_envs matches with NumPy arrays (struct of arrays) in a single step call.
+    Follows the rules of the scalar Paddle and Ball: with the same seeds the observations, rewards and dones are identical.
+    A SimpleHeuristicAgent opponent is vectorized, other opponents are called on each match with Paddle and Ball copies.
+    Opponents with a state (a reset method, like PredictiveAgent) are copied for each match and reset with it.
+    Finished matches are reset automatically, the last observation is stored in info['terminal_observation'].
+    """
+
+    def __init__(self, n_envs=64, opponent=None, points_to_win=21, max_steps=10000):
+        self.points_to_win = points_to_win
+        self.max_steps = max_steps
+        self.opponent = opponent if opponent is not None else SimpleHeuristicAgent()
+        self.opponent_policy = get_opponent_policy(self.opponent)
+        if hasattr(self.opponent, 'reset'):
+            self.opponents = [copy.deepcopy(self.opponent) for _ in range(n_envs)]
+            self.opponent_policies = [get_opponent_policy(opponent) for opponent in self.opponents]
+        else:
+            self.opponents = None
+            self.opponent_policies = [self.opponent_policy] * n_envs
+        self.render_mode = None
+
+        self.left_y = np.zeros(n_envs, dtype=np.int64)
+        self.right_y = np.zeros(n_envs, dtype=np.int64)
+        self.ball_x = np.zeros(n_envs, dtype=np.int64)
+        self.ball_y = np.zeros(n_envs, dtype=np.int64)
+        self.speed_x = np.zeros(n_envs, dtype=np.int64)
+        self.speed_y = np.zeros(n_envs, dtype=np.int64)
+        self.score_left = np.zeros(n_envs, dtype=np.int64)
+        self.score_right = np.zeros(n_envs, dtype=np.int64)
+        self.steps = np.zeros(n_envs, dtype=np.int64)
+        self.rngs = [random for _ in range(n_envs)]
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+        self.env_indices = np.arange(n_envs)
+
+        observation_space = spaces.Box(low=OBSERVATION_LOW, high=OBSERVATION_HIGH, dtype=np.float32)
+        action_space = spaces.Discrete(len(ACTIONS))
+        super().__init__(n_envs, observation_space, action_space)
+
+    def seed(self, seed=None):
+        # each match gets its own random number generator, seeded like PongEnv.reset(seed=seed + index)
+        if seed is None:
+            self.rngs = [random.Random() for _ in range(self.num_envs)]
+            return [None for _ in range(self.num_envs)]
+        self.rngs = [random.Random(seed + idx) for idx in range(self.num_envs)]
+        return [seed + idx for idx in range(self.num_envs)]
+
+    def reset(self):
+        for idx in range(self.num_envs):
+            self._reset_env(idx)
+        return self._get_state()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        # the opponent decides before the paddles move, like in PongEnv
+        opponent_actions = self._opponent_actions()
+        self.left_y = self._move(self.left_y, self.actions)
+        self.right_y = self._move(self.right_y, opponent_actions)
+
+        # same order of the checks as Ball.update
+        self.ball_x += self.speed_x
+        self.ball_y += self.speed_y
+        bounce = (self.ball_y <= 0) | (self.ball_y + BALL_SIZE >= SCREEN_HEIGHT)
+        self.speed_y[bounce] *= -1
+
+        ball_center = self.ball_y + BALL_SIZE // 2
+        hit_left = ((self.speed_x < 0) & (LEFT_PADDLE_X < self.ball_x) & (self.ball_x < LEFT_PADDLE_X + PADDLE_WIDTH) &
+                    (self.left_y < ball_center) & (ball_center < self.left_y + PADDLE_HEIGHT))
+        self.speed_x[hit_left] *= -1
+        ball_right = self.ball_x + BALL_SIZE
+        hit_right = ((self.speed_x > 0) & (RIGHT_PADDLE_X < ball_right) & (ball_right < RIGHT_PADDLE_X + PADDLE_WIDTH) &
+                     (self.right_y < ball_center) & (ball_center < self.right_y + PADDLE_HEIGHT))
+        self.speed_x[hit_right] *= -1
+
+        # points
+        right_scores = self.ball_x < 0
+        left_scores = self.ball_x > SCREEN_WIDTH
+        rewards = left_scores.astype(np.float32) - right_scores.astype(np.float32)
+        self.score_left += left_scores
+        self.score_right += right_scores
+        for idx in np.flatnonzero(left_scores | right_scores):
+            self._reset_ball(idx)
+
+        self.steps += 1
+        terminated = np.maximum(self.score_left, self.score_right) >= self.points_to_win
+        truncated = self.steps >= self.max_steps if self.max_steps is not None else np.zeros(self.num_envs, dtype=bool)
+        dones = terminated | truncated
+
+        states = self._get_state()
+        infos = [{'score': (int(left), int(right))} for left, right in zip(self.score_left, self.score_right)]
+        for idx in np.flatnonzero(dones):
+            infos[idx]['terminal_observation'] = states[idx].copy()
+            infos[idx]['TimeLimit.truncated'] = bool(truncated[idx] and not terminated[idx])
+            self._reset_env(idx)
+        if dones.any():
+            states[dones] = self._get_state()[dones]
+
+        return states, rewards, dones, infos
+
+    def close(self):
+        return
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    # helper function to reset a single match, same random draws as a new Ball
+    def _reset_env(self, idx):
+        self.left_y[idx] = PADDLE_START_Y
+        self.right_y[idx] = PADDLE_START_Y
+        self.score_left[idx] = 0
+        self.score_right[idx] = 0
+        self.steps[idx] = 0
+        if self.opponents is not None:
+            self.opponents[idx].reset()
+        self._reset_ball(idx)
+
+    # helper function to serve the ball of a single match, same random draws as Ball.reset
+    def _reset_ball(self, idx):
+        rng = self.rngs[idx]
+        self.ball_x[idx] = BALL_START_X
+        self.ball_y[idx] = BALL_START_Y
+        self.speed_x[idx] = BALL_SPEED_X * rng.choice((-1, 1))
+        self.speed_y[idx] = BALL_SPEED_Y * rng.choice((-1, 1))
+
+    # helper function to move the paddles, moves are clipped to the screen like Paddle.move_up and Paddle.move_down
+    def _move(self, paddle_y, actions):
+        paddle_y = paddle_y - PADDLE_SPEED * (actions == 1) + PADDLE_SPEED * (actions == 2)
+        return np.clip(paddle_y, 0, SCREEN_HEIGHT - PADDLE_HEIGHT)
+
+    # helper function to get the actions of the right paddles
+    def _opponent_actions(self):
+        if isinstance(self.opponent, SimpleHeuristicAgent):
+            # compares the centers of the ball and paddle, doubled to stay in integers
+            ball_center = 2 * self.ball_y + BALL_SIZE
+            paddle_center = 2 * self.right_y + PADDLE_HEIGHT
+            return np.where(ball_center < paddle_center, 1, np.where(ball_center > paddle_center, 2, 0))
+        # one Paddle and Ball are filled with the state of each match, the ball has its own generator to leave the others untouched
+        paddle = Paddle(RIGHT_PADDLE_X, PADDLE_START_Y)
+        ball = Ball(random.Random(0))
+        actions = []
+        for idx in range(self.num_envs):
+            paddle.y = int(self.right_y[idx])
+            ball.x, ball.y = int(self.ball_x[idx]), int(self.ball_y[idx])
+            ball.speed_x, ball.speed_y = int(self.speed_x[idx]), int(self.speed_y[idx])
+            actions.append(ACTIONS.index(self.opponent_policies[idx](paddle, ball)))
+        return np.array(actions, dtype=np.int64)
+
+    # helper function to get the current states of all matches, the left player's observation of PongEnv
+    def _get_state(self):
+        return np.stack([
+            self.ball_x / SCREEN_WIDTH,
+            self.ball_y / SCREEN_HEIGHT,
+            self.speed_x / BALL_SPEED_X,
+            self.speed_y / BALL_SPEED_Y,
+            self.left_y / SCREEN_HEIGHT,
+            self.right_y / SCREEN_HEIGHT,
+        ], axis=1).astype(np.float32)
+
+
+def check_parity(n_envs=8, n_steps=20000, seed=0, opponent=None):
+    """
+    Steps VecPong and n_envs PongEnv with the same seeds and random actions, raises an AssertionError on the first difference.
+    The opponent must be deterministic, the global random module is not drawn in the same order by both sides.
+    Each PongEnv gets its own copy of the opponent, like the matches of VecPong.
+    """
+    vec_env = VecPong(n_envs, opponent=opponent)
+    vec_env.seed(seed)
+    states = vec_env.reset()
+    envs = [PongEnv(opponent=copy.deepcopy(opponent), render_mode=None) for _ in range(n_envs)]
+    observations = [env.reset(seed=seed + idx)[0] for idx, env in enumerate(envs)]
+    assert np.array_equal(states, np.array(observations)), "observations differ after reset"
+
+    action_rng = np.random.default_rng(seed)
+    for step in range(n_steps):
+        actions = action_rng.integers(0, len(ACTIONS), size=n_envs)
+        states, rewards, dones, infos = vec_env.step(actions)
+        for idx, env in enumerate(envs):
+            observation, reward, terminated, truncated, _ = env.step(actions[idx])
+            if terminated or truncated:
+                assert np.array_equal(infos[idx]['terminal_observation'], observation), f"terminal observations differ in env {idx} at step {step}"
+                observation, _ = env.reset()
+            assert np.array_equal(states[idx], observation), f"observations differ in env {idx} at step {step}"
+            assert rewards[idx] == reward and dones[idx] == (terminated or truncated), f"rewards or dones differ in env {idx} at step {step}"
+
+
+if __name__ == '__main__':
+    check_parity()
+    check_parity(opponent=PredictiveAgent(reaction_delay=5))
+    print('VecPong matches PongEnv')
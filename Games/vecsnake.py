@@ -0,0 +1,222 @@
+import random
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from snake import VISION, SCREEN_RATIO, MAX_STEPS, FOOD_ATTEMPTS, Game
+
+# Directions are encoded like the actions of the Game: 0:'up', 1:'right', 2:'down', 3:'left'
+# offsets are given as (col, row)
+DIRECTION_OFFSETS = np.array([[0, -1], [1, 0], [0, 1], [-1, 0]], dtype=np.int64)
+
+
+class VecSnake(VecEnv):
+    """
+    Vectorized Snake engine, advances n_envs games with NumPy arrays in a single step call.
+    Follows the rules of the scalar Game: with the same seeds the observations, rewards and dones are identical.
+    Finished games are reset automatically, the last observation is stored in info['terminal_observation'].
+    """
+
+    def __init__(self, n_envs=8, width=640//SCREEN_RATIO, height=480//SCREEN_RATIO, scale=10):
+        self.screen_width = width
+        self.screen_height = height
+        self.scale = scale
+        self.num_rows = self.screen_height // self.scale
+        self.num_cols = self.screen_width // self.scale
+        self.render_mode = None
+
+        # the board is padded with walls so the vision window never leaves the array
+        self.pad = max(VISION, 1)
+        self.window = 2*VISION+1
+        # occupancy grids: number of snake segments (or walls) on each cell, indexed [env, row, col]
+        self.board = np.ones((n_envs, self.num_rows+2*self.pad, self.num_cols+2*self.pad), dtype=np.uint8)
+        # ring buffers holding the (col, row) of each body segment, the head is at body[head_idx]
+        self.capacity = self.num_rows*self.num_cols + 1
+        self.body = np.zeros((n_envs, self.capacity, 2), dtype=np.int64)
+        self.head_idx = np.zeros(n_envs, dtype=np.int64)
+        self.length = np.ones(n_envs, dtype=np.int64)
+        self.direction = np.zeros(n_envs, dtype=np.int64)
+        self.food = np.zeros((n_envs, 2), dtype=np.int64)
+        self.score = np.zeros(n_envs, dtype=np.int64)
+        self.timesteps = np.zeros(n_envs, dtype=np.int64)
+        self.total_timesteps = np.zeros(n_envs, dtype=np.int64)
+        self.rngs = [random for _ in range(n_envs)]
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+
+        # index of the head in the flattened vision window, excluded from the observation like in the Game
+        self.center = self.window**2 // 2
+        self.window_offsets = np.arange(self.window)
+        self.env_indices = np.arange(n_envs)
+
+        observation_space = spaces.Box(low=0, high=1, shape=(self.window**2-1+8,), dtype=int)
+        action_space = spaces.Discrete(4)
+        super().__init__(n_envs, observation_space, action_space)
+
+    def seed(self, seed=None):
+        # each game gets its own random number generator, seeded like Game.seed(seed + index)
+        if seed is None:
+            self.rngs = [random.Random() for _ in range(self.num_envs)]
+            return [None for _ in range(self.num_envs)]
+        self.rngs = [random.Random(seed + idx) for idx in range(self.num_envs)]
+        return [seed + idx for idx in range(self.num_envs)]
+
+    def reset(self):
+        for idx in range(self.num_envs):
+            self._reset_env(idx)
+        return self._get_state()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        envs = self.env_indices
+        # change direction only if the action is perpendicular to the current direction
+        perpendicular = (self.actions - self.direction) % 2 == 1
+        self.direction = np.where(perpendicular, self.actions, self.direction)
+
+        # move the heads
+        head = self.body[envs, self.head_idx]
+        new_head = head + DIRECTION_OFFSETS[self.direction]
+        tail_idx = (self.head_idx - self.length + 1) % self.capacity
+        tail = self.body[envs, tail_idx]
+        self.head_idx = (self.head_idx + 1) % self.capacity
+        self.body[envs, self.head_idx] = new_head
+
+        # the tail stays in place when the snake eats the food
+        ate = (new_head == self.food).all(axis=1)
+        moved = ~ate
+        self.board[envs[moved], tail[moved, 1]+self.pad, tail[moved, 0]+self.pad] -= 1
+        self.length += ate
+        # out of bounds heads land on the padding, so walls and body both show up as a count above one
+        new_head_rows = np.clip(new_head[:, 1]+self.pad, 0, self.board.shape[1]-1)
+        new_head_cols = np.clip(new_head[:, 0]+self.pad, 0, self.board.shape[2]-1)
+        self.board[envs, new_head_rows, new_head_cols] += 1
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        rewards[ate] += 10
+        self.score += ate
+        self.timesteps[ate] = 0
+        for idx in np.flatnonzero(ate):
+            self._place_food(idx)
+
+        # check for collisions and starvation
+        collisions = self.board[envs, new_head_rows, new_head_cols] > 1
+        dones = collisions | (self.timesteps > MAX_STEPS*self.length)
+        rewards[dones] -= 10
+
+        states = self._get_state()
+        self.timesteps += 1
+        self.total_timesteps += 1
+
+        infos = [{'timesteps': int(steps)} for steps in self.total_timesteps]
+        for idx in np.flatnonzero(dones):
+            infos[idx]['terminal_observation'] = states[idx].copy()
+            self._reset_env(idx)
+        if dones.any():
+            states[dones] = self._get_state()[dones]
+
+        return states, rewards, dones, infos
+
+    def close(self):
+        return
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    # helper function to reset a single game
+    def _reset_env(self, idx):
+        col, row = self.num_cols//2, self.num_rows//2
+        self.board[idx] = 1
+        self.board[idx, self.pad:self.pad+self.num_rows, self.pad:self.pad+self.num_cols] = 0
+        self.board[idx, row+self.pad, col+self.pad] = 1
+        self.head_idx[idx] = 0
+        self.body[idx, 0] = (col, row)
+        self.length[idx] = 1
+        self.direction[idx] = 0
+        self.score[idx] = 0
+        self.timesteps[idx] = 0
+        self.total_timesteps[idx] = 0
+        self._place_food(idx)
+
+    # helper function to draw new food, same random draws as Game._place_food
+    def _place_food(self, idx):
+        rng = self.rngs[idx]
+        for _ in range(FOOD_ATTEMPTS):
+            col, row = rng.randint(0, self.num_cols-1), rng.randint(0, self.num_rows-1)
+            if self.board[idx, row+self.pad, col+self.pad] == 0:
+                self.food[idx] = (col, row)
+                return
+        free_cells = np.flatnonzero(self.board[idx, self.pad:self.pad+self.num_rows, self.pad:self.pad+self.num_cols] == 0)
+        if len(free_cells) > 0:
+            cell = free_cells[rng.randrange(len(free_cells))]
+            col, row = cell % self.num_cols, cell // self.num_cols
+        self.food[idx] = (col, row)
+
+    # helper function to get the current states of all games
+    def _get_state(self):
+        head = self.body[self.env_indices, self.head_idx]
+        # window starts VISION cells before the head, which is at head + pad in the padded board
+        rows = head[:, 1, None] + self.pad - VISION + self.window_offsets
+        cols = head[:, 0, None] + self.pad - VISION + self.window_offsets
+        rows = np.clip(rows, 0, self.board.shape[1]-1)
+        cols = np.clip(cols, 0, self.board.shape[2]-1)
+        window = self.board[self.env_indices[:, None, None], rows[:, :, None], cols[:, None, :]] > 0
+        # the Game iterates over columns first, then rows
+        window = window.transpose(0, 2, 1).reshape(self.num_envs, -1)
+        window = np.delete(window, self.center, axis=1)
+
+        features = np.stack([
+            # Directions
+            self.direction == 0,
+            self.direction == 2,
+            self.direction == 3,
+            self.direction == 1,
+            # relative food location
+            self.food[:, 1] < head[:, 1],
+            self.food[:, 1] > head[:, 1],
+            self.food[:, 0] < head[:, 0],
+            self.food[:, 0] > head[:, 0],
+        ], axis=1)
+
+        return np.concatenate([window, features], axis=1).astype(int)
+
+
+def check_parity(n_envs=8, n_steps=20000, seed=0):
+    """
+    Steps VecSnake and n_envs Game with the same seeds and random actions, raises an AssertionError on the first difference.
+    """
+    vec_env = VecSnake(n_envs)
+    vec_env.seed(seed)
+    states = vec_env.reset()
+    envs = [Game(render_mode=None) for _ in range(n_envs)]
+    for idx, env in enumerate(envs):
+        env.seed(seed + idx)
+    observations = [env.reset() for env in envs]
+    assert np.array_equal(states, np.array(observations)), "observations differ after reset"
+
+    action_rng = np.random.default_rng(seed)
+    for step in range(n_steps):
+        actions = action_rng.integers(0, 4, size=n_envs)
+        states, rewards, dones, infos = vec_env.step(actions)
+        for idx, env in enumerate(envs):
+            observation, reward, done, info = env.step(int(actions[idx]))
+            if done:
+                assert np.array_equal(infos[idx]['terminal_observation'], observation), f"terminal observations differ in env {idx} at step {step}"
+                observation = env.reset()
+            assert np.array_equal(states[idx], observation), f"observations differ in env {idx} at step {step}"
+            assert rewards[idx] == reward and dones[idx] == done, f"rewards or dones differ in env {idx} at step {step}"
+            assert infos[idx]['timesteps'] == info['timesteps'], f"timesteps differ in env {idx} at step {step}"
+
+
+if __name__ == '__main__':
+    check_parity()
+    print('VecSnake matches Game')
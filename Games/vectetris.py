@@ -0,0 +1,290 @@
+import random
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+from tetris import (GRID_WIDTH, GRID_HEIGHT, SHAPES, BLOCK_OFFSETS, FRAME_ACTIONS, MAX_ROTATIONS, GRAVITY_FRAMES,
+                    TetrisEnv, get_afterstates)
+
+# Block offsets (dx, dy) indexed [shape, rotation, block], rotations past the last one of a shape repeat the first ones
+BLOCK_TABLE = np.array([[BLOCK_OFFSETS[shape][rotation % len(BLOCK_OFFSETS[shape])] for rotation in range(MAX_ROTATIONS)]
+                        for shape in range(len(SHAPES))])
+NUM_ROTATIONS = np.array([len(shape) for shape in SHAPES])
+# dx of the leftmost block indexed [shape, rotation]
+MIN_DX = BLOCK_TABLE[:, :, :, 0].min(axis=2)
+SPAWN_X, SPAWN_Y = GRID_WIDTH // 2, 0
+ROW_INDICES = np.arange(GRID_HEIGHT)
+
+
+class VecTetris(VecEnv):
+    """
+    Vectorized TetrisEnv, advances n_envs games with the boards in one (n_envs, GRID_HEIGHT, GRID_WIDTH) array and the
+    pieces in per-game arrays, with batched moves, rotations, drops, locks and line clears.
+    Pieces come from a 7-bag per game (each shape once in a shuffled bag), or with parity=True from the uniform draws
+    of the Tetris class, in which case the observations, rewards and dones match TetrisEnv seeded with seed + index.
+    Finished games are reset automatically, the last observation is stored in info['terminal_observation'].
+    """
+
+    def __init__(self, n_envs=64, action_mode='placement', gravity_frames=GRAVITY_FRAMES, max_steps=None, parity=False):
+        if action_mode not in ('frame', 'placement'):
+            raise ValueError(f"action_mode must be 'frame' or 'placement', not {action_mode!r}")
+        self.action_mode = action_mode
+        self.gravity_frames = gravity_frames
+        self.max_steps = max_steps
+        self.parity = parity
+        self.render_mode = None
+
+        self.boards = np.zeros((n_envs, GRID_HEIGHT, GRID_WIDTH), dtype=bool)
+        self.shape = np.zeros(n_envs, dtype=np.int64)
+        self.rotation = np.zeros(n_envs, dtype=np.int64)
+        self.x = np.full(n_envs, SPAWN_X, dtype=np.int64)
+        self.y = np.full(n_envs, SPAWN_Y, dtype=np.int64)
+        self.next_shape = np.zeros(n_envs, dtype=np.int64)
+        self.score = np.zeros(n_envs, dtype=np.int64)
+        self.steps = np.zeros(n_envs, dtype=np.int64)
+        self.game_over = np.zeros(n_envs, dtype=bool)
+        # bags of the 7-bag randomizer and the position of the next shape in them
+        self.bags = np.zeros((n_envs, len(SHAPES)), dtype=np.int64)
+        self.bag_position = np.full(n_envs, len(SHAPES), dtype=np.int64)
+        self.rngs = [random for _ in range(n_envs)] if parity else [np.random.default_rng() for _ in range(n_envs)]
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+        self.env_indices = np.arange(n_envs)
+
+        observation_space = spaces.Dict({
+            'board': spaces.Box(low=0, high=1, shape=(GRID_HEIGHT, GRID_WIDTH), dtype=np.int8),
+            'piece': spaces.Box(low=0, high=1, shape=(GRID_HEIGHT, GRID_WIDTH), dtype=np.int8),
+            'current_shape': spaces.Discrete(len(SHAPES)),
+            'next_shape': spaces.Discrete(len(SHAPES)),
+        })
+        if action_mode == 'frame':
+            action_space = spaces.Discrete(len(FRAME_ACTIONS))
+        else:
+            action_space = spaces.Discrete(MAX_ROTATIONS * GRID_WIDTH)
+        super().__init__(n_envs, observation_space, action_space)
+
+    def seed(self, seed=None):
+        # each game gets its own random number generator, seeded like TetrisEnv.reset(seed=seed + index)
+        if seed is None:
+            self.rngs = [random.Random() if self.parity else np.random.default_rng() for _ in range(self.num_envs)]
+            return [None for _ in range(self.num_envs)]
+        self.rngs = [random.Random(seed + idx) if self.parity else np.random.default_rng(seed + idx) for idx in range(self.num_envs)]
+        return [seed + idx for idx in range(self.num_envs)]
+
+    def reset(self):
+        self._reset_envs(self.env_indices)
+        return self._get_state()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        score = self.score.copy()
+        if self.action_mode == 'frame':
+            self._frame_step(self.actions)
+        else:
+            self._placement_step(self.actions)
+        self.steps += 1
+
+        rewards = ((self.score - score) / 100).astype(np.float32)
+        terminated = self.game_over.copy()
+        truncated = self.steps >= self.max_steps if self.max_steps is not None else np.zeros(self.num_envs, dtype=bool)
+        dones = terminated | truncated
+
+        states = self._get_state()
+        infos = [{'score': int(score)} for score in self.score]
+        done = np.flatnonzero(dones)
+        for idx in done:
+            infos[idx]['terminal_observation'] = {key: value[idx].copy() for key, value in states.items()}
+            infos[idx]['TimeLimit.truncated'] = bool(truncated[idx] and not terminated[idx])
+        if len(done) > 0:
+            self._reset_envs(done)
+            new_states = self._get_state()
+            for key in states:
+                states[key][done] = new_states[key][done]
+
+        return states, rewards, dones, infos
+
+    def action_masks(self):
+        # distinct reachable placements of each game, like TetrisEnv.action_masks
+        if self.action_mode == 'frame':
+            return np.ones((self.num_envs, len(FRAME_ACTIONS)), dtype=bool)
+        masks = np.zeros((self.num_envs, MAX_ROTATIONS * GRID_WIDTH), dtype=bool)
+        for shape in np.unique(self.shape):
+            indices = np.flatnonzero(self.shape == shape)
+            afterstates = get_afterstates(self.boards[indices], shape, SPAWN_X, SPAWN_Y)
+            masks[indices[afterstates['board_index']], afterstates['action']] = True
+        return masks
+
+    def close(self):
+        return
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    # helper function to apply the frame actions then the automatic fall, like TetrisEnv in frame mode
+    def _frame_step(self, actions):
+        for action, (dx, dy) in (('left', (-1, 0)), ('right', (1, 0)), ('down', (0, 1))):
+            self._move(self.env_indices[actions == FRAME_ACTIONS.index(action)], dx, dy)
+        self._rotate(self.env_indices[actions == FRAME_ACTIONS.index('rotate')])
+        self._hard_drop(self.env_indices[actions == FRAME_ACTIONS.index('drop')])
+        if self.gravity_frames:
+            falling = self.env_indices[((self.steps + 1) % self.gravity_frames == 0) & ~self.game_over]
+            moved = self._move(falling, 0, 1)
+            self._lock(falling[~moved])
+
+    # helper function to rotate, slide and hard drop the pieces, like TetrisEnv._resolve_placement
+    def _placement_step(self, actions):
+        rotations, columns = np.divmod(actions, GRID_WIDTH)
+        rotations = rotations % NUM_ROTATIONS[self.shape]
+        for turn in range(MAX_ROTATIONS - 1):
+            self._rotate(self.env_indices[rotations > turn])
+        dx = columns - (self.x + MIN_DX[self.shape, self.rotation])
+        # each piece slides one column at a time until it reaches its column or is blocked
+        sliding = self.env_indices[dx != 0]
+        while len(sliding) > 0:
+            moved = self._move(sliding, np.sign(dx[sliding]), 0)
+            dx[sliding[moved]] -= np.sign(dx[sliding[moved]])
+            sliding = sliding[moved & (dx[sliding] != 0)]
+        self._hard_drop(self.env_indices)
+
+    # helper function to check if the pieces of some games fit at a position
+    def _fits(self, indices, rotation, x, y):
+        offsets = BLOCK_TABLE[self.shape[indices], rotation]
+        xs = x[:, None] + offsets[:, :, 0]
+        ys = y[:, None] + offsets[:, :, 1]
+        inside = (xs >= 0) & (xs < GRID_WIDTH) & (ys < GRID_HEIGHT)
+        filled = self.boards[indices[:, None], np.clip(ys, 0, GRID_HEIGHT - 1), np.clip(xs, 0, GRID_WIDTH - 1)] & (ys >= 0)
+        return (inside & ~filled).all(axis=1)
+
+    # helper function to move the pieces of some games when they fit, returns which ones moved
+    def _move(self, indices, dx, dy):
+        moved = self._fits(indices, self.rotation[indices], self.x[indices] + dx, self.y[indices] + dy)
+        dx = np.broadcast_to(dx, indices.shape)
+        self.x[indices[moved]] += dx[moved]
+        self.y[indices[moved]] += dy
+        return moved
+
+    # helper function to rotate the pieces of some games when they fit
+    def _rotate(self, indices):
+        rotation = (self.rotation[indices] + 1) % NUM_ROTATIONS[self.shape[indices]]
+        rotated = self._fits(indices, rotation, self.x[indices], self.y[indices])
+        self.rotation[indices[rotated]] = rotation[rotated]
+
+    # helper function to move the pieces of some games down as far as they go, then lock them
+    def _hard_drop(self, indices):
+        falling = indices
+        while len(falling) > 0:
+            falling = falling[self._move(falling, 0, 1)]
+        self._lock(indices)
+
+    # helper function to lock the pieces of some games, clear the full rows and bring the next pieces, like Tetris.lock_piece
+    def _lock(self, indices):
+        if len(indices) == 0:
+            return
+        offsets = BLOCK_TABLE[self.shape[indices], self.rotation[indices]]
+        xs = self.x[indices, None] + offsets[:, :, 0]
+        ys = self.y[indices, None] + offsets[:, :, 1]
+        inside = ys >= 0
+        self.boards[np.broadcast_to(indices[:, None], ys.shape)[inside], ys[inside], xs[inside]] = True
+
+        # full rows are moved to the top, in a stable order for the others, then emptied
+        boards = self.boards[indices]
+        full = boards.all(axis=2)
+        lines_cleared = full.sum(axis=1)
+        if lines_cleared.any():
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+            boards[ROW_INDICES[None, :] < lines_cleared[:, None]] = False
+            self.boards[indices] = boards
+        self.score[indices] += lines_cleared * 100
+
+        self.shape[indices] = self.next_shape[indices]
+        self._spawn(indices)
+        self.next_shape[indices] = [self._draw_shape(idx) for idx in indices]
+        self.game_over[indices] = ~self._fits(indices, self.rotation[indices], self.x[indices], self.y[indices])
+
+    # helper function to put the current pieces of some games at the spawn position
+    def _spawn(self, indices):
+        self.rotation[indices] = 0
+        self.x[indices] = SPAWN_X
+        self.y[indices] = SPAWN_Y
+
+    # helper function to draw the next shape of a game, same random draws as Tetris.get_new_piece in parity mode
+    def _draw_shape(self, idx):
+        rng = self.rngs[idx]
+        if self.parity:
+            return rng.choice(range(len(SHAPES)))
+        if self.bag_position[idx] == len(SHAPES):
+            self.bags[idx] = rng.permutation(len(SHAPES))
+            self.bag_position[idx] = 0
+        self.bag_position[idx] += 1
+        return self.bags[idx, self.bag_position[idx] - 1]
+
+    # helper function to start new games
+    def _reset_envs(self, indices):
+        self.boards[indices] = False
+        self.score[indices] = 0
+        self.steps[indices] = 0
+        self.game_over[indices] = False
+        self.bag_position[indices] = len(SHAPES)
+        self.shape[indices] = [self._draw_shape(idx) for idx in indices]
+        self.next_shape[indices] = [self._draw_shape(idx) for idx in indices]
+        self._spawn(indices)
+
+    # helper function to get the observations of all games, the ones of TetrisEnv
+    def _get_state(self):
+        offsets = BLOCK_TABLE[self.shape, self.rotation]
+        xs = self.x[:, None] + offsets[:, :, 0]
+        ys = self.y[:, None] + offsets[:, :, 1]
+        visible = (ys >= 0) & (ys < GRID_HEIGHT)
+        piece = np.zeros((self.num_envs, GRID_HEIGHT, GRID_WIDTH), dtype=np.int8)
+        piece[np.broadcast_to(self.env_indices[:, None], ys.shape)[visible], ys[visible], xs[visible]] = 1
+        return {
+            'board': self.boards.astype(np.int8),
+            'piece': piece,
+            'current_shape': self.shape.copy(),
+            'next_shape': self.next_shape.copy(),
+        }
+
+
+def check_parity(n_envs=8, n_steps=2000, seed=0, action_mode='placement'):
+    """
+    Steps VecTetris in parity mode and n_envs TetrisEnv with the same seeds and random actions, raises an AssertionError
+    on the first difference.
+    """
+    vec_env = VecTetris(n_envs, action_mode=action_mode, parity=True)
+    vec_env.seed(seed)
+    states = vec_env.reset()
+    envs = [TetrisEnv(action_mode=action_mode, render_mode=None) for _ in range(n_envs)]
+    observations = [env.reset(seed=seed + idx)[0] for idx, env in enumerate(envs)]
+
+    action_rng = np.random.default_rng(seed)
+    for step in range(n_steps):
+        for idx, observation in enumerate(observations):
+            for key, value in observation.items():
+                assert np.array_equal(states[key][idx], value), f"{key} differs in env {idx} at step {step}"
+        actions = action_rng.integers(0, vec_env.action_space.n, size=n_envs)
+        states, rewards, dones, infos = vec_env.step(actions)
+        for idx, env in enumerate(envs):
+            observation, reward, terminated, truncated, _ = env.step(actions[idx])
+            if terminated or truncated:
+                for key, value in observation.items():
+                    assert np.array_equal(infos[idx]['terminal_observation'][key], value), f"terminal {key} differs in env {idx} at step {step}"
+                observation, _ = env.reset()
+            observations[idx] = observation
+            assert rewards[idx] == reward and dones[idx] == (terminated or truncated), f"rewards or dones differ in env {idx} at step {step}"
+
+
+if __name__ == '__main__':
+    for action_mode in ('placement', 'frame'):
+        check_parity(action_mode=action_mode)
+    print('VecTetris matches TetrisEnv')
@@ -0,0 +1,29 @@
+import gymnasium as gym
+
+
+class FrameSkip(gym.Wrapper):
+    """
+    Repeats each action of the agent for `skip` steps of the wrapped environment (action repeat), the agent only decides every `skip` frames.
+    The rewards of the repeated steps are summed, the observation and info are the ones of the last step.
+    The repetition stops at the end of an episode. Works with environments that return 4 values (done) or 5 (terminated, truncated).
+    """
+
+    def __init__(self, env, skip=4):
+        super().__init__(env)
+        if skip < 1:
+            raise ValueError(f"skip must be at least 1, got {skip}")
+        self.skip = skip
+
+    def reset(self, **kwargs):
+        # only forwards the arguments it was given, some games don't take a seed
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        total_reward = 0.0
+        for _ in range(self.skip):
+            result = self.env.step(action)
+            total_reward += result[1]
+            done = result[2] or result[3] if len(result) == 5 else result[2]
+            if done:
+                break
+        return (result[0], total_reward) + tuple(result[2:])
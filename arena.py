@@ -0,0 +1,189 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import itertools
+import importlib
+import argparse
+import random
+import json
+import time
+import sys
+import os
+import numpy as np
+
+GAMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Games")
+
+# name: (module in Games, agent class, keyword arguments)
+AGENTS = {
+    "connect4": {
+        "random": ("connect4", "SimpleComputerPlayer", {}),
+        "heuristic": ("connect4", "HeuristicAgent", {}),
+        "alphabeta": ("connect4", "AlphaBetaAgent", {"time_budget": 0.05}),
+    },
+    "tictactoe": {
+        "random": ("tictactoe", "SimpleComputerPlayer", {}),
+        "perfect": ("tictactoe", "PerfectAgent", {}),
+    },
+}
+
+
+def make_agent(game, spec):
+    """
+    Creates an agent from its name in AGENTS, or from a 'module:Class' path for any other AgentInterface.
+    """
+    if GAMES_DIR not in sys.path:
+        sys.path.insert(0, GAMES_DIR)
+    if spec in AGENTS[game]:
+        module_name, class_name, kwargs = AGENTS[game][spec]
+    else:
+        module_name, class_name = spec.split(":")
+        kwargs = {}
+    return getattr(importlib.import_module(module_name), class_name)(**kwargs)
+
+
+def play_connect4(first, second):
+    """
+    Plays one game of Connect Four, returns 1 or 2 for the winner (first or second agent) and 0 for a draw.
+    An invalid move loses the game.
+    """
+    from connect4 import Board, BitBoard
+    board, bitboard = Board(), BitBoard()
+    agents = {1: first, 2: second}
+    piece = 1
+    while not bitboard.is_full():
+        col = agents[piece].act(board, piece)
+        if col is None or not 0 <= col < len(board.grid[0]) or not bitboard.is_valid_location(col):
+            return 3 - piece
+        board.drop_piece(board.get_next_open_row(col), col, piece)
+        bitboard.make_move(col, piece)
+        if bitboard.check_for_win(piece):
+            return piece
+        piece = 3 - piece
+    return 0
+
+
+def play_tictactoe(first, second):
+    """
+    Plays one game of Tic Tac Toe, returns 1 or 2 for the winner (first or second agent) and 0 for a draw.
+    An invalid move loses the game.
+    """
+    from tictactoe import Board
+    board = Board()
+    agents = {1: first, 2: second}
+    player = 1
+    while True:
+        move = agents[player].act(board, player)
+        if move is None:
+            return 3 - player
+        row, col = move
+        if not 0 <= row < board.rows or not 0 <= col < board.cols or not board.make_move(row, col, player):
+            return 3 - player
+        winner = board.check_winner()
+        if winner == 'draw':
+            return 0
+        if winner:
+            return winner
+        player = 3 - player
+
+
+PLAY = {
+    "connect4": play_connect4,
+    "tictactoe": play_tictactoe,
+}
+
+
+def play_match(game, spec_a, spec_b, n_games, first_game, seed):
+    """
+    Plays n_games between two agents in a worker process, agent a moves first in the even games.
+    Returns the wins of a, the draws and the wins of b.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    agent_a, agent_b = make_agent(game, spec_a), make_agent(game, spec_b)
+    wins_a, draws, wins_b = 0, 0, 0
+    for i in range(first_game, first_game + n_games):
+        a_first = i % 2 == 0
+        winner = PLAY[game](agent_a, agent_b) if a_first else PLAY[game](agent_b, agent_a)
+        if winner == 0:
+            draws += 1
+        elif (winner == 1) == a_first:
+            wins_a += 1
+        else:
+            wins_b += 1
+    return wins_a, draws, wins_b
+
+
+def elo_ratings(agents, results, iterations=1000):
+    """
+    Fits Elo ratings (mean 1500) to the results of all the pairs by maximum likelihood, a draw counts half a win.
+    Each pair gets one extra draw so that agents that never lose or never win keep a finite rating.
+    """
+    n = len(agents)
+    games = np.zeros((n, n))
+    scores = np.zeros((n, n))
+    for (a, b), (wins_a, draws, wins_b) in results.items():
+        i, j = agents.index(a), agents.index(b)
+        games[i, j] = games[j, i] = wins_a + draws + wins_b + 1
+        scores[i, j] = wins_a + 0.5 * draws + 0.5
+        scores[j, i] = wins_b + 0.5 * draws + 0.5
+    ratings = np.zeros(n)
+    for _ in range(iterations):
+        expected = 1 / (1 + 10 ** ((ratings[None, :] - ratings[:, None]) / 400))
+        gradient = (scores - games * expected).sum(axis=1)
+        ratings += 400 * gradient / np.maximum(games.sum(axis=1), 1)
+        ratings -= ratings.mean()
+    return {agent: 1500 + rating for agent, rating in zip(agents, ratings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-robin tournament between agents, without display")
+    parser.add_argument("game", choices=list(PLAY), help="game to play")
+    parser.add_argument("agents", nargs="+", help="agents by name (" + ", ".join(f"{game}: {' '.join(names)}" for game, names in AGENTS.items()) + ") or as module:Class")
+    parser.add_argument("-n", "--games", type=int, default=1000, help="number of games per pair of agents")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunk", type=int, default=100, help="number of games per task sent to a worker")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the first task, the others use the following seeds")
+    parser.add_argument("-o", "--json", type=str, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    # each pair plays its games in chunks, so that the pool stays busy with few pairs
+    pairs = list(itertools.combinations(args.agents, 2))
+    tasks = []
+    for a, b in pairs:
+        for first_game in range(0, args.games, args.chunk):
+            tasks.append((a, b, min(args.chunk, args.games - first_game), first_game))
+
+    results = {pair: (0, 0, 0) for pair in pairs}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [(a, b, executor.submit(play_match, args.game, a, b, n_games, first_game, args.seed + i)) for i, (a, b, n_games, first_game) in enumerate(tasks)]
+        for a, b, future in futures:
+            results[(a, b)] = tuple(total + new for total, new in zip(results[(a, b)], future.result()))
+    elapsed = time.perf_counter() - start
+    total_games = sum(sum(result) for result in results.values())
+    ratings = elo_ratings(args.agents, results)
+
+    print(f'{"agent":<20} {"opponent":<20} {"wins":>6} {"draws":>6} {"losses":>6}')
+    for (a, b), (wins_a, draws, wins_b) in results.items():
+        print(f'{a:<20} {b:<20} {wins_a:>6} {draws:>6} {wins_b:>6}')
+    print()
+    print(f'{"agent":<20} {"elo":>6}')
+    for agent in sorted(args.agents, key=ratings.get, reverse=True):
+        print(f'{agent:<20} {ratings[agent]:>6.0f}')
+    print()
+    print(f'{total_games} games in {elapsed:.1f} s, {total_games / elapsed:.0f} games/sec')
+
+    if args.json:
+        report = {
+            "game": args.game,
+            "games_per_pair": args.games,
+            "seed": args.seed,
+            "results": [{"agent": a, "opponent": b, "wins": wins_a, "draws": draws, "losses": wins_b} for (a, b), (wins_a, draws, wins_b) in results.items()],
+            "elo": ratings,
+            "games_per_sec": total_games / elapsed,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import subprocess
+import importlib
+import argparse
+import platform
+import resource
+import random
+import json
+import time
+import sys
+import os
+import numpy as np
+
+GAMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Games")
+
+# name: (module in Games, environment class)
+ENVIRONMENTS = {
+    "snake": ("snake", "Game"),
+    "flappybird": ("flappybird", "FlappyBirdEnv"),
+    "lunarlander": ("lunarlander", "LunarLanderEnv"),
+    "pacman": ("pacman", "PacManEnv"),
+    "spaceinvaders": ("spaceinvaders", "SpaceInvadersEnv"),
+    "pong": ("pong", "PongEnv"),
+    "tetris": ("tetris", "TetrisEnv"),
+}
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def benchmark_env(name, steps, seed):
+    """
+    Steps the environment with random actions, resetting it at the end of each episode, and measures the latencies.
+    Runs in its own process so that the peak memory belongs to this environment only.
+    """
+    if GAMES_DIR not in sys.path:
+        sys.path.insert(0, GAMES_DIR)
+    module_name, class_name = ENVIRONMENTS[name]
+    start = time.perf_counter()
+    env_class = getattr(importlib.import_module(module_name), class_name)
+    import_time = time.perf_counter() - start
+
+    # the games draw from the global random generators, or from their own one when they can be seeded
+    random.seed(seed)
+    np.random.seed(seed)
+    env = env_class()
+    if hasattr(env, "seed"):
+        env.seed(seed)
+    action_rng = np.random.default_rng(seed)
+    actions = action_rng.integers(0, env.action_space.n, size=steps)
+
+    step_times = np.zeros(steps, dtype=np.int64)
+    reset_times = []
+    episodes = 0
+    start = time.perf_counter_ns()
+    env.reset()
+    reset_times.append(time.perf_counter_ns() - start)
+    loop_start = time.perf_counter_ns()
+    for i in range(steps):
+        step_start = time.perf_counter_ns()
+        result = env.step(int(actions[i]))
+        step_times[i] = time.perf_counter_ns() - step_start
+        # gym environments return 4 values, gymnasium environments 5 (terminated and truncated)
+        done = result[2] or result[3] if len(result) == 5 else result[2]
+        if done:
+            episodes += 1
+            reset_start = time.perf_counter_ns()
+            env.reset()
+            reset_times.append(time.perf_counter_ns() - reset_start)
+    loop_time = (time.perf_counter_ns() - loop_start) / 1e9
+
+    return {
+        "steps": steps,
+        "episodes": episodes,
+        "steps_per_sec": steps / loop_time,
+        "import_ms": import_time * 1e3,
+        "reset_ms_mean": float(np.mean(reset_times)) / 1e6,
+        "step_us_p50": float(np.percentile(step_times, 50)) / 1e3,
+        "step_us_p99": float(np.percentile(step_times, 99)) / 1e3,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_revision():
+    """
+    Returns the current git commit, or None outside of a git repository.
+    """
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the step throughput of the environments with random actions")
+    parser.add_argument("-e", "--envs", nargs="+", choices=list(ENVIRONMENTS), default=list(ENVIRONMENTS), help="environments to benchmark")
+    parser.add_argument("-n", "--steps", type=int, default=10000, help="number of steps per environment")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the environments and of the random actions")
+    parser.add_argument("-o", "--json", type=str, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"environment":<15} {"steps/s":>10} {"reset ms":>9} {"p50 us":>8} {"p99 us":>8} {"RSS MB":>7}')
+    for name in args.envs:
+        # a fresh process per environment, spawned so that nothing is inherited from the previous ones
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(benchmark_env, name, args.steps, args.seed).result()
+        results[name] = result
+        print(f'{name:<15} {result["steps_per_sec"]:>10.0f} {result["reset_ms_mean"]:>9.3f} {result["step_us_p50"]:>8.1f} {result["step_us_p99"]:>8.1f} {result["peak_rss_mb"]:>7.1f}')
+
+    if args.json:
+        report = {
+            "commit": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "steps": args.steps,
+            "seed": args.seed,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
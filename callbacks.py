@@ -0,0 +1,195 @@
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.logger import HParam
+from stable_baselines3.common.evaluation import evaluate_policy
+from game import Game, VISION, SCREEN_RATIO, MAX_STEPS
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import time
+import os
+import numpy as np
+import torch as th
+
+vision = VISION
+screen_ratio = SCREEN_RATIO
+max_steps = MAX_STEPS
+
+
+class HParamCallback(BaseCallback):
+    """
+    Saves the hyperparameters and metrics at the start of the training, and logs them to TensorBoard.
+    """
+
+    def _on_training_start(self) -> None:
+        hparam_dict = {
+            "algorithm": self.model.__class__.__name__,
+            "learning rate": self.model.learning_rate,
+            "gamma": self.model.gamma,
+            "vision field": vision,
+            "screen ratio": screen_ratio,
+            "max steps ratio": max_steps,
+        }
+        # define the metrics that will appear in the `HPARAMS` Tensorboard tab by referencing their tag
+        # Tensorbaord will find & display metrics from the `SCALARS` tab
+        metric_dict = {
+            "eval/mean_ep_len": 0.0,
+            "eval/mean_reward": 0.0,
+            "rollout/ep_len_mean": 0,
+            "rollout/ep_rew_mean": 0,
+        }
+        self.logger.record(
+            "hparams",
+            HParam(hparam_dict, metric_dict),
+            exclude=("stdout", "log", "json", "csv"),
+        )
+
+    def _on_step(self) -> bool:
+        return True
+
+class ThroughputCallback(BaseCallback):
+    """
+    Measures the number of environment steps per second achieved during the training, and prints it at the end.
+    """
+
+    def _on_training_start(self) -> None:
+        self.start_time = time.time()
+        self.start_timesteps = self.model.num_timesteps
+
+    def _on_rollout_end(self) -> None:
+        self.logger.record("time/env_steps_per_sec", self._steps_per_sec())
+
+    def _on_training_end(self) -> None:
+        print(f"Env steps/sec: {self._steps_per_sec():.0f} ({self.training_env.num_envs} envs)")
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _steps_per_sec(self) -> float:
+        elapsed = max(time.time() - self.start_time, 1e-8)
+        return (self.model.num_timesteps - self.start_timesteps) / elapsed
+
+
+class StepProfileCallback(BaseCallback):
+    """
+    Logs the mean time per call of each phase of the environments' step function at the end of each rollout.
+    The environments must be created with profile=True, their stats are summed over all the training environments.
+    """
+
+    def _init_callback(self) -> None:
+        self.previous_totals = {}
+
+    def _on_rollout_end(self) -> None:
+        totals = {}
+        for stats in self.training_env.env_method("stats"):
+            for phase, values in stats.items():
+                seconds, calls = totals.get(phase, (0.0, 0))
+                totals[phase] = (seconds + values["time"], calls + values["calls"])
+        # only the calls made since the previous rollout
+        for phase, (seconds, calls) in totals.items():
+            previous_seconds, previous_calls = self.previous_totals.get(phase, (0.0, 0))
+            if calls > previous_calls:
+                self.logger.record(f"profile/{phase}_us", 1e6 * (seconds - previous_seconds) / (calls - previous_calls))
+        self.previous_totals = totals
+
+    def _on_step(self) -> bool:
+        return True
+
+
+def evaluate_snapshot(algorithm_class, snapshot_path, n_eval_episodes):
+    """
+    Loads a saved model and evaluates it on a new Game, runs in the worker processes of AsyncEvalCallback.
+    """
+    # one thread per worker, the workers already run in parallel
+    th.set_num_threads(1)
+    model = algorithm_class.load(snapshot_path, device="cpu")
+    episode_rewards, episode_lengths = evaluate_policy(model, Monitor(Game()), n_eval_episodes=n_eval_episodes, deterministic=True, return_episode_rewards=True)
+    return episode_rewards, episode_lengths
+
+
+class AsyncEvalCallback(BaseCallback):
+    """
+    Evaluates the agent like EvalCallback, but without pausing the training: the model is saved to a snapshot
+    and the evaluation episodes run in a pool of worker processes. The results are logged when they are ready,
+    and the snapshot becomes the best model if its mean reward is the best so far.
+    An evaluation is skipped while the previous one is still running.
+    """
+
+    def __init__(self, n_eval_episodes=5, eval_freq=1000, n_workers=2, best_model_save_path="./logs", log_path="./logs", verbose=1):
+        super().__init__(verbose)
+        self.n_eval_episodes = n_eval_episodes
+        self.eval_freq = eval_freq
+        self.n_workers = n_workers
+        self.best_model_save_path = best_model_save_path
+        self.log_path = log_path
+        self.best_mean_reward = -np.inf
+        self.pending = None
+        self.evaluations_timesteps = []
+        self.evaluations_results = []
+        self.evaluations_length = []
+
+    def _init_callback(self) -> None:
+        os.makedirs(self.best_model_save_path, exist_ok=True)
+        os.makedirs(self.log_path, exist_ok=True)
+        # spawn the workers, forking a process that already runs torch can deadlock
+        self.executor = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _on_step(self) -> bool:
+        if self.pending is not None and all(future.done() for future in self.pending[2]):
+            self._collect()
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            if self.pending is None:
+                self._submit()
+            elif self.verbose >= 1:
+                print(f"Skipping evaluation at num_timesteps={self.num_timesteps}, the previous one is still running")
+        return True
+
+    def _on_training_end(self) -> None:
+        # wait for the last evaluation
+        if self.pending is not None:
+            self._collect()
+        self.executor.shutdown()
+
+    def _submit(self):
+        # snapshot the current weights, the workers load them from disk
+        snapshot_path = os.path.join(self.best_model_save_path, f"eval_snapshot_{self.num_timesteps}.zip")
+        self.model.save(snapshot_path)
+        chunks = [len(chunk) for chunk in np.array_split(np.arange(self.n_eval_episodes), self.n_workers) if len(chunk) > 0]
+        futures = [self.executor.submit(evaluate_snapshot, self.model.__class__, snapshot_path, chunk) for chunk in chunks]
+        self.pending = (self.num_timesteps, snapshot_path, futures)
+
+    def _collect(self):
+        timesteps, snapshot_path, futures = self.pending
+        self.pending = None
+        episode_rewards, episode_lengths = [], []
+        for future in futures:
+            rewards, lengths = future.result()
+            episode_rewards.extend(rewards)
+            episode_lengths.extend(lengths)
+
+        # same outputs as EvalCallback
+        self.evaluations_timesteps.append(timesteps)
+        self.evaluations_results.append(episode_rewards)
+        self.evaluations_length.append(episode_lengths)
+        np.savez(
+            os.path.join(self.log_path, "evaluations"),
+            timesteps=self.evaluations_timesteps,
+            results=self.evaluations_results,
+            ep_lengths=self.evaluations_length,
+        )
+        mean_reward, std_reward = np.mean(episode_rewards), np.std(episode_rewards)
+        mean_ep_length, std_ep_length = np.mean(episode_lengths), np.std(episode_lengths)
+        if self.verbose >= 1:
+            print(f"Eval num_timesteps={timesteps}, episode_reward={mean_reward:.2f} +/- {std_reward:.2f}")
+            print(f"Episode length: {mean_ep_length:.2f} +/- {std_ep_length:.2f}")
+        self.logger.record("eval/mean_reward", float(mean_reward))
+        self.logger.record("eval/mean_ep_len", float(mean_ep_length))
+        self.logger.record("time/total_timesteps", timesteps, exclude="tensorboard")
+        self.logger.dump(timesteps)
+
+        if mean_reward > self.best_mean_reward:
+            if self.verbose >= 1:
+                print("New best mean reward!")
+            self.best_mean_reward = mean_reward
+            os.replace(snapshot_path, os.path.join(self.best_model_save_path, "best_model.zip"))
+        else:
+            os.remove(snapshot_path)
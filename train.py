@@ -1,76 +1,115 @@
-from stable_baselines3 import A2C, DQN, PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import EvalCallback, BaseCallback
-from stable_baselines3.common.logger import HParam
-from game import Game, VISION, SCREEN_RATIO, MAX_STEPS
+from contextlib import contextmanager
+import multiprocessing
 import argparse
+import time
 
-vision = VISION
-screen_ratio = SCREEN_RATIO
-max_steps = MAX_STEPS
 
-
-class HParamCallback(BaseCallback):
+@contextmanager
+def profile(name, timings):
     """
-    Saves the hyperparameters and metrics at the start of the training, and logs them to TensorBoard.
+    Measures the time spent in the block and appends it to timings, used to report the startup time.
     """
+    start = time.perf_counter()
+    yield
+    timings.append((name, time.perf_counter() - start))
 
-    def _on_training_start(self) -> None:
-        hparam_dict = {
-            "algorithm": self.model.__class__.__name__,
-            "learning rate": self.model.learning_rate,
-            "gamma": self.model.gamma,
-            "vision field": vision,
-            "screen ratio": screen_ratio,
-            "max steps ratio": max_steps,
-        }
-        # define the metrics that will appear in the `HPARAMS` Tensorboard tab by referencing their tag
-        # Tensorbaord will find & display metrics from the `SCALARS` tab
-        metric_dict = {
-            "eval/mean_ep_len": 0.0,
-            "eval/mean_reward": 0.0,
-            "rollout/ep_len_mean": 0,
-            "rollout/ep_rew_mean": 0,
-        }
-        self.logger.record(
-            "hparams",
-            HParam(hparam_dict, metric_dict),
-            exclude=("stdout", "log", "json", "csv"),
-        )
 
-    def _on_step(self) -> bool:
-        return True
+def make_env(seed, profile=False):
+    """
+    Returns a function creating a seeded Snake game, used by the vectorized environments.
+    The game module is imported by the worker itself, so the workers don't need the training imports.
+    """
+    def _init():
+        from game import Game
+        env = Game(profile=profile)
+        env.seed(seed)
+        return env
+    return _init
 
 # FIXME : more complicated state doesn't really help, complicates too much and the model stagnates. Since the model starts stagnating there is no improvement, so can cap the training at 500k/1M and see if stagnates.
 # Only scale training steps if after 500k/1M is still showing improvements !
 # Try different options : bigger architecture or CnnPolicy on the little square ?
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-a","--algorithm", type=str, help="algorithm to train: DQN, A2C, PPO")
-parser.add_argument("-t","--timesteps", type=float, help="number of training steps")
-args = parser.parse_args()
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-a","--algorithm", type=str, help="algorithm to train: DQN, A2C, PPO")
+    parser.add_argument("-t","--timesteps", type=float, help="number of training steps")
+    parser.add_argument("-n","--n-envs", type=int, default=1, help="number of parallel training environments")
+    parser.add_argument("--vec-backend", type=str, choices=["dummy", "subproc"], default="dummy", help="run the environments sequentially (dummy) or in subprocesses (subproc)")
+    parser.add_argument("-s","--seed", type=int, default=0, help="seed of the first environment, the others use the following seeds")
+    parser.add_argument("--async-eval", action="store_true", help="run the evaluations in worker processes without pausing the training")
+    parser.add_argument("--eval-workers", type=int, default=2, help="number of worker processes for the asynchronous evaluation")
+    parser.add_argument("--profile-startup", action="store_true", help="report the time spent importing modules and creating the environments")
+    parser.add_argument("--profile-steps", action="store_true", help="log the time spent in each phase of the environments' step to TensorBoard")
+    args = parser.parse_args()
+
+    # Heavy imports are done once the arguments are parsed, and only for the selected algorithm
+    timings = []
+    with profile("game", timings):
+        from game import Game
+    # torch is imported on its own to separate its import time from stable_baselines3
+    with profile("torch", timings):
+        import torch
+    with profile("stable_baselines3", timings):
+        from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
+        from stable_baselines3.common.monitor import Monitor
+        from stable_baselines3.common.callbacks import EvalCallback
+    with profile(f"algorithm ({args.algorithm or 'PPO'})", timings):
+        if args.algorithm=='DQN':
+            from stable_baselines3 import DQN as algorithm_class
+        elif args.algorithm=='A2C':
+            from stable_baselines3 import A2C as algorithm_class
+        else:
+            from stable_baselines3 import PPO as algorithm_class
+    with profile("callbacks", timings):
+        from callbacks import HParamCallback, ThroughputCallback, AsyncEvalCallback, StepProfileCallback
+
+    # Hyperparameters
+    TRAINING_STEPS = args.timesteps if args.timesteps else 1e6
+    hparam_callback = HParamCallback()
+    throughput_callback = ThroughputCallback()
+
+    if args.vec_backend == "subproc":
+        vec_env_cls = SubprocVecEnv
+        # the workers are forked from a server that has already imported their modules, instead of importing them each
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            multiprocessing.get_context("forkserver").set_forkserver_preload(["stable_baselines3.common.vec_env.subproc_vec_env", "game"])
+    else:
+        vec_env_cls = DummyVecEnv
+    with profile(f"environments ({args.n_envs} x {args.vec_backend})", timings):
+        env = VecMonitor(vec_env_cls([make_env(args.seed + i, args.profile_steps) for i in range(args.n_envs)]))
+    if args.profile_startup:
+        print('Startup time:')
+        for name, seconds in timings:
+            print(f'  {name:<30} {seconds:8.3f} s')
+        print(f'  {"total":<30} {sum(seconds for _, seconds in timings):8.3f} s')
+    print('Observation space:', env.observation_space)
+    print('Action space:', env.action_space)
+    # Use deterministic actions for evaluation, every 1000 steps in total over all the training environments
+    eval_freq = max(1000 // args.n_envs, 1)
+    if args.async_eval:
+        eval_callback = AsyncEvalCallback(n_eval_episodes=5, eval_freq=eval_freq, n_workers=args.eval_workers, best_model_save_path="./logs", log_path="./logs", verbose=1)
+    else:
+        # Separate evaluation env
+        eval_env = Monitor(Game())
+        eval_callback = EvalCallback(eval_env, best_model_save_path="./logs",log_path="./logs",  n_eval_episodes=5, eval_freq=eval_freq, deterministic=True, render=False, verbose=1)
+    # train
+    print('Starting training...')
+    if args.algorithm=='DQN':
+        model = algorithm_class("MlpPolicy", env, learning_starts=10000, buffer_size=100000,tensorboard_log="./tensorboard_logs/", verbose=1)
+        log_interval = 100
+    elif args.algorithm=='A2C':
+        model = algorithm_class("MlpPolicy", env, tensorboard_log="./tensorboard_logs/", verbose=1)
+        log_interval = 100
+    else:
+        model = algorithm_class("MlpPolicy", env, tensorboard_log="./tensorboard_logs/", verbose=1)
+        log_interval = 1
+    callbacks = [throughput_callback, eval_callback, hparam_callback]
+    if args.profile_steps:
+        callbacks.append(StepProfileCallback())
+    model.learn(total_timesteps=TRAINING_STEPS, log_interval=log_interval, callback=callbacks, progress_bar=True)
+    env.close()
 
-# Hyperparameters
-TRAINING_STEPS = args.timesteps if args.timesteps else 1e6
-hparam_callback = HParamCallback()
 
-env = Monitor(Game())
-print('Observation space:', env.observation_space)
-print('Action space:', env.action_space)
-# Separate evaluation env
-eval_env = Monitor(Game())
-# Use deterministic actions for evaluation
-eval_callback = EvalCallback(eval_env, best_model_save_path="./logs",log_path="./logs",  n_eval_episodes=5, eval_freq=1000, deterministic=True, render=False, verbose=1)
-# train
-print('Starting training...')
-if args.algorithm=='DQN':
-    model = DQN("MlpPolicy", env, learning_starts=10000, buffer_size=100000,tensorboard_log="./tensorboard_logs/", verbose=1)
-    log_interval = 100
-elif args.algorithm=='A2C':
-    model = A2C("MlpPolicy", env, tensorboard_log="./tensorboard_logs/", verbose=1)
-    log_interval = 100
-else:
-    model = PPO("MlpPolicy", env, tensorboard_log="./tensorboard_logs/", verbose=1)
-    log_interval = 1
-model.learn(total_timesteps=TRAINING_STEPS, log_interval=log_interval, callback=[eval_callback, hparam_callback], progress_bar=True)
+if __name__ == '__main__':
+    main()